@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import copy
+import time
+import timeit
+import logging
+import argparse
+import platform
+import tempfile
+import itertools
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+
+from classes.Car import Car, get_car_data, get_data, load_data_cache, save_data_cache
+from classes.Genetic import GeneticSolver
+from classes.Utils import CIRCUIT, get_basic_logger
+
+parser = argparse.ArgumentParser(description='Benchmark of the solver hot paths.')
+parser.add_argument('--c', type=str, default=None, help='Circuit (all the circuits in the Data folder if not given)')
+parser.add_argument('--w', type=str, default='Sunny.txt', help='Weather file (the first one of the circuit if it does not exist)')
+parser.add_argument('--pop', type=int, default=250, help='Population used by the population-wide benchmarks')
+parser.add_argument('--laps', type=int, default=20, help='Laps of the truncated race explored by the bruteforce benchmark')
+parser.add_argument('--repeat', type=int, default=5, help='Repetitions of every benchmark, the best one is kept')
+parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator of the solver')
+parser.add_argument('--out', type=str, default='Benchmark.json', help='JSON file where the results are written')
+parser.add_argument('--baseline', type=str, default='Benchmark_baseline.json', help='JSON file of the baseline the results are compared with')
+parser.add_argument('--save', action='store_true', default=False, help='Save the results as the new baseline instead of comparing them')
+parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown over the baseline reported as a regression')
+args = parser.parse_args()
+
+logger = get_basic_logger('Benchmark', logging.INFO)
+
+# Function to time a callable: the number of calls per repetition is chosen by timeit so that a repetition lasts at least 0.2 seconds
+def measure(func, repeat:int) -> dict:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    timings = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+    return {'Calls': number * repeat, 'Best': min(timings), 'Median': float(np.median(timings))}
+
+# Function to get a solver racing only the first laps of the circuit (the bruteforce tree of the whole race is too big to be timed), the lookup tables are cut from the ones of the full race
+def truncated_solver(solver:GeneticSolver, laps:int) -> GeneticSolver:
+    truncated = copy.copy(solver)
+    truncated.numLaps = min(laps, solver.numLaps)
+    truncated.tyreWearTable = solver.tyreWearTable[:, :truncated.numLaps]
+    truncated.lapTimeTable = solver.lapTimeTable[:, :truncated.numLaps, :truncated.numLaps]
+    truncated.maxStintLength = np.minimum(solver.maxStintLength, truncated.numLaps)
+    truncated.bruteforceTables = None
+
+    return truncated
+
+# Function to load the practice data of a circuit from the csv as get_car_data does
+def load_full_data(path:str) -> dict:
+    data_load = pd.read_csv(os.path.join(path, 'FullData.csv'))
+
+    return {tyre: [data_load.loc[data_load['Compound'] == tyre, :]] for tyre in data_load['Compound'].unique()}
+
+# Function to get the benchmarks of a circuit as name -> callable, everything they need is built here and not timed
+def circuit_benchmarks(path:str, circuit:str, weather:str, save_path:str) -> dict:
+    benchmarks = dict()
+    car = get_car_data(path, seed=args.seed)
+    solver = GeneticSolver(population=args.pop, car=car, circuit=circuit, weather=weather, save_path=save_path, seed=args.seed)
+    weather_list = solver.weather.get_weather_percentage_list()
+    conditions = [solver.weather.get_weather_string(w) for w in weather_list[:solver.numLaps//2]]
+
+    ### Model of the car and of the solver
+    benchmarks['predict_laptime'] = lambda: car.predict_laptime(tyre='Medium', tyre_age=10, lap=solver.numLaps//2, start_fuel=100, conditions_str=conditions, conditions_int=weather_list[solver.numLaps//2])
+    benchmarks['getLapTime'] = lambda: solver.getLapTime(compound=1, compoundAge=10, lap=solver.numLaps//2, fuel_load=50.0, pitStop=False)
+
+    ### Operators work on views of a fixed pool of random strategies, so every call gets a different one and none is changed
+    benchmarks['randomChild'] = solver.randomChild
+    benchmarks['initSolver'] = solver.initSolver
+    strategies = solver.randomChildren(64)
+    pool = itertools.cycle(strategies)
+    benchmarks['correct_strategy'] = lambda: solver.correct_strategy(next(pool).view())
+    benchmarks['crossover'] = lambda: solver.crossover(next(pool), next(pool))
+    benchmarks['mutation_compound'] = lambda: solver.mutation_compound(next(pool).view())
+    benchmarks['mutation_pitstop'] = lambda: solver.mutation_pitstop(next(pool).view())
+    benchmarks['mutation_pitstop_add'] = lambda: solver.mutation_pitstop_add(next(pool).view())
+    benchmarks['mutation_fuel_load'] = lambda: solver.mutation_fuel_load(next(pool).view())
+
+    ### Population-wide steps on an evaluated population
+    population = solver.initSolver()
+    _, best_eval = solver.getBest(population)
+    if np.isinf(best_eval):
+        best_eval = min([x.totalTime for x in population])
+    benchmarks['simulatePopulation'] = lambda: solver.simulatePopulation(population)
+    benchmarks['selection_dynamic_penalty'] = lambda: solver.selection_dynamic_penalty(step=1, population=population, threshold_quantile=0.3, best=best_eval)
+
+    ### Bruteforce on the first laps of the race, the tables are built once as in a real run
+    truncated = truncated_solver(solver, args.laps)
+    truncated.bruteforce_tables()
+    first_compounds = truncated.allowed_compounds(truncated.weather.get_weather_percentage_list()[0])
+    def branch_and_bound():
+        best_time, best_decisions = np.inf, None
+        for compound in first_compounds:
+            best_time, best_decisions = truncated.branch_and_bound(([compound], [False]), best_time, best_decisions)
+        return best_time, best_decisions
+    benchmarks['branch_and_bound'] = branch_and_bound
+    benchmarks['lower_bound_dp'] = solver.lower_bound_dp
+
+    ### Ingestion of the data: raw practice sessions if they are available, the collected csv and the calibration of the car otherwise
+    sessions = [os.path.join(path, fp) for fp in ['FP1', 'FP2', 'FP3'] if os.path.isdir(os.path.join(path, fp))]
+    if len(sessions) > 0:
+        def ingestion():
+            data = None
+            for session in sessions:
+                data = get_data(session, add_data=data)
+            return data
+        benchmarks['get_data'] = ingestion
+    if os.path.isfile(os.path.join(path, 'FullData.csv')):
+        benchmarks['load_full_data'] = lambda: load_full_data(path)
+        data = load_full_data(path)
+        benchmarks['car_calibration'] = lambda: Car(data=data)
+
+        ### Same data read back from the columnar cache written by get_car_data
+        os.makedirs(save_path, exist_ok=True)
+        save_data_cache(save_path, data)
+        benchmarks['load_data_cache'] = lambda: load_data_cache(save_path)
+
+    return benchmarks
+
+# Function to compare the results with the baseline, it returns the names of the regressions
+def compare(results:dict, baseline:dict, threshold:float) -> list:
+    regressions = []
+    print(f"\n{'Benchmark':<45} {'Baseline':>12} {'Current':>12} {'Ratio':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<45} {'-':>12} {result['Best']*1e6:>10.2f}us {'new':>8}")
+            continue
+
+        ratio = result['Best'] / baseline[name]['Best']
+        status = ''
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = 'improved'
+        print(f"{name:<45} {baseline[name]['Best']*1e6:>10.2f}us {result['Best']*1e6:>10.2f}us {ratio:>8.2f} {status}")
+
+    return regressions
+
+def main():
+    if args.c is None:
+        circuits = sorted([circuit for circuit in os.listdir('Data') if os.path.isdir(os.path.join('Data', circuit)) and circuit in CIRCUIT])
+    else:
+        circuits = [args.c]
+
+    results = dict()
+    start_timer = time.time()
+    with tempfile.TemporaryDirectory() as save_path:
+        for circuit in circuits:
+            path = os.path.join('Data', circuit)
+            weathers = sorted(os.listdir(os.path.join(path, 'Weather')))
+            weather = args.w if args.w in weathers else weathers[0]
+            logger.info(f"{circuit} with weather '{weather}'")
+
+            ### Solvers print their reports, only the timings are of interest here
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                benchmarks = circuit_benchmarks(path, circuit, weather, os.path.join(save_path, circuit))
+                for name, func in benchmarks.items():
+                    results[f"{circuit}.{name}"] = measure(func, args.repeat)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+
+            for name in benchmarks.keys():
+                logger.info(f"{circuit}.{name}: {results[f'{circuit}.{name}']['Best']*1e6:.2f} us per call")
+
+    report = {
+        'Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'Python': platform.python_version(),
+        'NumPy': np.__version__,
+        'Pandas': pd.__version__,
+        'Platform': platform.platform(),
+        'Settings': {'Population': args.pop, 'Laps': args.laps, 'Repeat': args.repeat, 'Seed': args.seed, 'Weather': args.w},
+        'Results': results,
+    }
+
+    out = args.baseline if args.save else args.out
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=4)
+    logger.info(f"Benchmark done in {round(time.time()-start_timer, 2)} seconds, results written to {out}")
+
+    if args.save or not os.path.isfile(args.baseline):
+        return 0
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)['Results']
+
+    regressions = compare(results, baseline, args.threshold)
+    if len(regressions) > 0:
+        print(f"\n{len(regressions)} regressions over {round(args.threshold*100)}%: {', '.join(regressions)}")
+        return 1
+
+    print(f"\nNo regressions over {round(args.threshold*100)}%")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,25 +1,66 @@
 import os
+import json
 import math
+import bisect
+import hashlib
 import pickle
 import logging
 import numpy as np
 import pandas as pd
 import plotly.express as px
 
-from random import SystemRandom
 
 from classes.Utils import VISUAL_COMPOUNDS, ms_to_time, get_basic_logger
 
-random = SystemRandom()
 logger = get_basic_logger('Car', logging.INFO)
 
+# Version of the schema of Car.json, cars saved with another one are calibrated again (0 is the pickle of the whole car of the older versions)
+CAR_VERSION: int = 1
+
+# Fitted parameters of the model of the car, the only values saved in Car.json
+CAR_PARAMETERS: list = ['tyre_used', 'fuel_lose', 'drs_lose', 'fuel_consume_coeff', 'time_diff', 'tyre_wear_coeff', 'tyre_coeff']
+
 def linear_fun(x, a):
     if isinstance(x, np.ndarray):
         return a*x
     return round(a*x)
 
+# Function to round a value as round does, arrays of laps are rounded element by element (half to even as round)
+def round_value(x):
+    if isinstance(x, np.ndarray):
+        return np.round(x)
+    return round(x)
+
+# Function to get the columns used by the calibration of every stint as numpy arrays, the calibration does not touch pandas afterwards
+# Stints loaded from the cache are already in this form and are kept as they are
+def stint_arrays(data:dict) -> dict:
+    stints = dict()
+    for tyre, val in data.items():
+        stints[tyre] = [t_data if isinstance(t_data, dict) else {'Lap': t_data['Lap'].values, 'LapTime': t_data['LapTime'].values, 'Fuel': t_data['Fuel'].values, 'DRS': t_data['DRS'].values == True, 'Wear': t_data[['FLWear', 'FRWear', 'RLWear', 'RRWear']].values.astype(float)} for t_data in val]
+
+    return stints
+
+# Function to stack a column of the stints in an array [stint, lap] padded with nan, it returns also the number of laps of every stint
+def stack_stints(stints:list, column:str):
+    lengths = np.array([len(stint[column]) for stint in stints])
+    stacked = np.full((len(stints), lengths.max()), np.nan)
+    for idx, stint in enumerate(stints):
+        stacked[idx, :lengths[idx]] = stint[column]
+
+    return stacked, lengths
+
+# Function to turn the numpy scalars of the parameters into python ones, so they can be written as json
+def to_builtin(value):
+    if isinstance(value, dict):
+        return {key: to_builtin(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(val) for val in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
 class Car:
-    def __init__(self, data:dict=None, load_path:str=None):
+    def __init__(self, data:dict=None, load_path:str=None, seed=None):
         self.data = None
         self.tyre_used:list = []
         self.drs_lose:int = 0
@@ -28,99 +69,111 @@ class Car:
         self.time_diff:dict = {}
         self.tyre_wear_coeff:dict = {}
         self.tyre_coeff:dict = {}
+        self.version:int = CAR_VERSION
+        self.source:str = None
         
         
         if data is not None:
             self.data = data
-            self.drs_lose:int = random.randint(500,800)
-            self.fuel_lose = random.randint(28,32)
+            ### Initial values of the calibration are drawn from the generator of the run (seed can be a Generator, a SeedSequence or an int)
+            random = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+            self.drs_lose:int = int(random.integers(500,801))
+            self.fuel_lose = int(random.integers(28,33))
             self.fuel_consume_coeff = {'Dry':0, 'Wet':0}
             self.time_diff = {'Medium':600, 'Hard':1100, 'Inter':6000, 'Wet':9000}
             self.tyre_coeff = {'Soft':{'FL':13, 'FR':13, 'RL':14, 'RR':14}, 'Medium':{'FL':11, 'FR':11, 'RL':12, 'RR':12}, 'Hard':{'FL':9, 'FR':9, 'RL':10, 'RR':10}, 'Inter':{'FL':6, 'FR':6, 'RL':5, 'RR':5}, 'Wet':{'FL':4, 'FR':4, 'RL':3, 'RR':3}}
             for key in ['Soft', 'Medium', 'Hard', 'Inter', 'Wet']:
                 self.tyre_wear_coeff[key] = {'FL':0, 'FR':0, 'RL':0, 'RR':0}
 
+            ### Stints are turned into arrays once, every step of the calibration works on them
+            stints = stint_arrays(data)
             self.extract_tyre_used(data)
-            self.compute_fuel_lose(data)
-            self.compute_fuel_consume_coeff(data)
-            self.compute_drs_lose(data)
-            self.compute_tyre_wear_and_time_lose(data)  
-            self.compute_time_compound(data)
+            self.compute_fuel_lose(stints)
+            self.compute_fuel_consume_coeff(stints)
+            self.compute_drs_lose(stints)
+            self.compute_tyre_wear_and_time_lose(stints)  
+            self.compute_time_compound(stints)
 
         if load_path is not None:
-            data = self.load(load_path)
-            self.data = data.data
-            self.tyre_used = data.tyre_used
-            self.drs_lose = data.drs_lose
-            self.fuel_lose = data.fuel_lose
-            self.fuel_consume_coeff = data.fuel_consume_coeff
-            self.tyre_wear_coeff = data.tyre_wear_coeff
-            self.tyre_coeff = data.tyre_coeff
-            self.time_diff = data.time_diff
+            params = self.load(load_path)
+            self.version = params['Version']
+            self.source = params.get('Source')
+            for key in CAR_PARAMETERS:
+                if key in params:
+                    setattr(self, key, params[key])
+
+    def __getstate__(self):
+        ### The practice data is only used by the calibration, the processes the car is sent to only get the parameters
+        state = self.__dict__.copy()
+        state['data'] = None
+        return state
     
     def extract_tyre_used(self, data:dict):
         for key in data.keys():
             self.tyre_used.append(key)
 
-    def compute_fuel_lose(self, data:dict):
-        for _, val in data.items():
+    def compute_fuel_lose(self, stints:dict):
+        for _, val in stints.items():
             if len(val) > 1:
-                fuel_lists = []
-                time_list = []
-                drs = []
-                for idx, t_data in enumerate(val):
-                    fuel_lists.append(t_data['Fuel'].values)
-                    time_list.append(t_data['LapTime'].values)
-                    if any(t_data['DRS'] == True):
-                        drs.append(idx)
-                
-                for i, fi_data in enumerate(fuel_lists):
-                    for j, fj_data in enumerate(fuel_lists[i:]):
-                        if round(fi_data[0]) != round(fj_data[0]):
-                            time_diff = []
-                            for x in range(min(len(time_list[i]), len(time_list[j]))):
-                                if (i in drs and j not in drs) or (j in drs and i not in drs):
-                                    time_diff.append(time_list[i][x]-time_list[j][x]-self.drs_lose)
-                                else:
-                                    time_diff.append(time_list[i][x]-time_list[j][x])
-                                    
-                            fuel_diff = [fi_data[x] - fj_data[x] for x in range(min(len(fi_data), len(fj_data)))]
-                
-                            if self.fuel_lose == 0:
-                                self.fuel_lose = np.mean(time_diff)/np.mean(fuel_diff)
-                            else:
-                                old_fuel_lose = self.fuel_lose
-                                self.fuel_lose = round((old_fuel_lose+(np.mean(time_diff)/np.mean(fuel_diff)))/2)
-
-    def compute_drs_lose(self, data:dict):
-        for _, val in data.items():
-            if len(val) > 1:
-                drs = []
-                no_drs = []
-                for t_data in val:
-                    if any(t_data['DRS'] == True):
-                        drs = t_data[t_data['DRS'] == True]
-                    if any(t_data['DRS'] == False): 
-                        no_drs = t_data[t_data['DRS'] == False]
+                fuel, lengths = stack_stints(val, 'Fuel')
+                times, _ = stack_stints(val, 'LapTime')
+                drs = np.array([stint['DRS'].any() for stint in val])
+
+                ### Couples of stints in the order of the original double loop: the fuel is the one of stint i+j, while the lap times and the DRS are the ones of stint j
+                i = np.repeat(np.arange(len(val)), len(val) - np.arange(len(val)))
+                j = np.concatenate([np.arange(len(val) - idx) for idx in range(len(val))])
+                k = i + j
+                couples = np.round(fuel[i, 0]) != np.round(fuel[k, 0])
+                i, j, k = i[couples], j[couples], k[couples]
+
+                ### Means over the laps the two stints have in common, the other laps are zeroed
+                laps = np.arange(fuel.shape[1])
+                common_times = laps < np.minimum(lengths[i], lengths[j])[:, None]
+                time_diff = times[i] - times[j] - np.where(drs[i] != drs[j], self.drs_lose, 0)[:, None]
+                time_diff = np.where(common_times, time_diff, 0).sum(axis=1) / common_times.sum(axis=1)
+
+                common_fuel = laps < np.minimum(lengths[i], lengths[k])[:, None]
+                fuel_diff = np.where(common_fuel, fuel[i] - fuel[k], 0).sum(axis=1) / common_fuel.sum(axis=1)
+
+                ### Every couple is averaged with the coefficient computed so far
+                for ratio in (time_diff / fuel_diff).tolist():
+                    if self.fuel_lose == 0:
+                        self.fuel_lose = ratio
+                    else:
+                        self.fuel_lose = round((self.fuel_lose+ratio)/2)
 
-                if len(drs) > 0 and len(no_drs) > 0:
-                    max_len = min(len(drs['LapTime'].values), len(no_drs['LapTime'].values))
+    def compute_drs_lose(self, stints:dict):
+        for _, val in stints.items():
+            if len(val) > 1:
+                ### Laps with and without DRS of the last stints having them
+                drs = None
+                no_drs = None
+                for stint in val:
+                    if stint['DRS'].any():
+                        drs = stint['DRS']
+                        drs_stint = stint
+                    if not stint['DRS'].all(): 
+                        no_drs = ~stint['DRS']
+                        no_drs_stint = stint
+
+                if drs is not None and no_drs is not None:
+                    max_len = min(drs.sum(), no_drs.sum())
 
                     ### Remove the time lost due to fuel component
-                    drs_time = [x-self.predict_fuel_time_lose(fuel) for x, fuel in zip(drs['LapTime'].values[:max_len], drs['Fuel'].values[:max_len])]
-                    no_drs_time = [x-self.predict_fuel_time_lose(fuel) for x, fuel in zip(no_drs['LapTime'].values[:max_len], no_drs['Fuel'].values[:max_len])]
+                    drs_time = drs_stint['LapTime'][drs][:max_len] - self.predict_fuel_time_lose(drs_stint['Fuel'][drs][:max_len])
+                    no_drs_time = no_drs_stint['LapTime'][no_drs][:max_len] - self.predict_fuel_time_lose(no_drs_stint['Fuel'][no_drs][:max_len])
                     
-                    self.drs_lose = abs(round(np.mean(np.array(drs_time)-np.array(no_drs_time))))
+                    self.drs_lose = abs(round(np.mean(drs_time-no_drs_time)))
     
-    def compute_fuel_consume_coeff(self, data:dict):
+    def compute_fuel_consume_coeff(self, stints:dict):
         fuel_consume = {'Dry':[], 'Wet':[]}
-        for tyre, val in data.items():
+        for tyre, val in stints.items():
             if tyre in ['Soft', 'Medium', 'Hard']:
-                for t_data in val:
-                    fuel_consume['Dry'].append(t_data['Fuel'].values)
+                for stint in val:
+                    fuel_consume['Dry'].append(stint['Fuel'])
             elif tyre in ['Inter', 'Wet']:
-                for t_data in val:
-                    fuel_consume['Wet'].append(t_data['Fuel'].values)
+                for stint in val:
+                    fuel_consume['Wet'].append(stint['Fuel'])
 
         for key, vals in fuel_consume.items():       
             if len(vals) == 0:
@@ -157,88 +210,49 @@ class Car:
         
         pass
 
-    def compute_tyre_wear_and_time_lose(self, data:dict):
-        tyre_wear = {}    
-        for key in ['Soft', 'Medium', 'Hard', 'Inter', 'Wet']:
-            tyre_wear[key] = {'FL':[], 'FR':[], 'RL':[], 'RR':[]}
-
-        for tyre, val in data.items():
-            for t_data in val:
-                tyre_wear[tyre] = {'FL':[], 'FR':[], 'RL':[], 'RR':[]}
-                for fl, fr, rl, rr in t_data[['FLWear', 'FRWear', 'RLWear', 'RRWear']].values:
-                    tyre_wear[tyre]['FL'].append(fl)
-                    tyre_wear[tyre]['FR'].append(fr) 
-                    tyre_wear[tyre]['RL'].append(rl) 
-                    tyre_wear[tyre]['RR'].append(rr) 
-                
-                t_wear_coeff = {'FL':0, 'FR':0, 'RL':0, 'RR':0}
-                if len(self.tyre_wear_coeff[tyre]) > 0: # 
-                    t_wear_coeff['FL'] = self.tyre_wear_coeff[tyre]['FL']
-                    t_wear_coeff['FR'] = self.tyre_wear_coeff[tyre]['FR']
-                    t_wear_coeff['RL'] = self.tyre_wear_coeff[tyre]['RL']
-                    t_wear_coeff['RR'] = self.tyre_wear_coeff[tyre]['RR']
-
-                weighted_times = {'FL':[], 'FR':[], 'RL':[], 'RR':[]}
-                drs = any(t_data['DRS'] == True)
-                if not drs:
-                    times = [x-self.predict_fuel_time_lose(fuel) for x, fuel in zip(t_data['LapTime'].values, t_data['Fuel'].values)]
-                else:
-                    times = [x-self.predict_fuel_time_lose(fuel)-self.drs_lose for x, fuel in zip(t_data['LapTime'].values, t_data['Fuel'].values)]
-                best_time = min(times)
+    def compute_tyre_wear_and_time_lose(self, stints:dict):
+        wheels = ['FL', 'FR', 'RL', 'RR']
+        for tyre, val in stints.items():
+            for stint in val:
+                wear = stint['Wear']
+                laps = np.arange(1, len(wear)+1)
+
+                times = stint['LapTime'] - self.predict_fuel_time_lose(stint['Fuel'])
+                if stint['DRS'].any():
+                    times = times - self.drs_lose
                 
-                for i,time in enumerate(times):
-                    wear_sum = 0
-                    for key in ['FL', 'FR', 'RL', 'RR']:
-                        wear_sum += tyre_wear[tyre][key][i]
-
-                    for key in ['FL', 'FR', 'RL', 'RR']:
-                        weighted_times[key].append(round((time-best_time)*tyre_wear[tyre][key][i]/wear_sum))
-                   
-
-                for key in ['FL', 'FR', 'RL', 'RR']:
-                    old_coeff = 0
-                    if self.tyre_wear_coeff[tyre][key] != 0:
-                        old_coeff = self.tyre_wear_coeff[tyre][key]
-                    new_coeff = np.polyfit(np.arange(1,len(tyre_wear[tyre][key])+1), tyre_wear[tyre][key], 1)
+                ### Time lost with respect to the best lap, split among the wheels by their wear
+                weighted_times = np.round((times - times.min())[:, None] * wear / wear.sum(axis=1)[:, None])
+
+                ### Weights of the lap times: the inner laps by their distance from the mean of the two near laps, the first one is not considered
+                mu = np.round((weighted_times[:-2] + weighted_times[2:])/2)
+                sigma = np.abs(mu - weighted_times[1:-1])
+                ### pow of the laps is taken from python since np.power can differ in the last digit
+                weights = np.abs(1 - (sigma/100))/100 * np.array([pow(lap, 1.1) for lap in range(1, len(wear)-1)])[:, None]
+                last_w = np.abs((weighted_times[-1]-weighted_times[-2])/100)/100*pow(len(wear), 1.5)
+                weights = np.vstack((np.zeros((1, len(wheels))), weights, np.where(last_w > 0, last_w, 0)))
+
+                for idx, key in enumerate(wheels):
+                    old_coeff = self.tyre_wear_coeff[tyre][key]
+                    new_coeff = np.polyfit(laps, wear[:, idx], 1)
                     self.tyre_wear_coeff[tyre][key] = new_coeff[0] if old_coeff == 0 else (old_coeff+new_coeff[0])/2
 
-                    old_coeff = 0
-                    if self.tyre_coeff[tyre][key] != 0:
-                        old_coeff = self.tyre_coeff[tyre][key]
-                    
-                    mu = 0
-                    sigma = 0
-                    _w = [0]
-                    for idx, time in enumerate(weighted_times[key][1:-1]):
-                        mu = round((weighted_times[key][idx] + weighted_times[key][idx+2])/2)
-                        sigma = abs(mu-time)
-                        weight = abs(1 - (sigma/100))/100 * pow(idx+1, 1.1)
-                        _w.append(weight)
-
-                    last_w = abs((weighted_times[key][-1]-weighted_times[key][-2])/100)/100*pow(len(weighted_times[key]), 1.5)
-                    _w.append(last_w if last_w > 0 else 0)
-                    new_coeff = abs(np.polyfit(tyre_wear[tyre][key], weighted_times[key], 1, w=_w))
-                    
+                    old_coeff = self.tyre_coeff[tyre][key]
+                    new_coeff = abs(np.polyfit(wear[:, idx], weighted_times[:, idx], 1, w=weights[:, idx]))
                     self.tyre_coeff[tyre][key] = new_coeff[0] if old_coeff == 0 else (old_coeff+new_coeff[0])/2
                     
         self.compute_missing_wear_coeff()
     
-    def compute_time_compound(self, data:pd.DataFrame):
-        soft = data['Soft']
+    def compute_time_compound(self, stints:dict):
         best = {'Soft':np.inf, 'Medium':np.inf, 'Hard':np.inf, 'Inter':np.inf, 'Wet':np.inf}
-        for df in soft:
-            times = [x-self.predict_fuel_time_lose(fuel)-self.predict_tyre_time_lose('Soft',lap)['Total'] for x, fuel, lap in zip(df['LapTime'].values, df['Fuel'].values, df['Lap'].values)]
-            if all(df['DRS'] == False):
-                times = [x-self.drs_lose for x in times]
-            best['Soft'] = min(times) if math.isinf(best['Soft']) else (best['Soft']+min(times))/2
-        
-        for tyre, val in data.items():
-            if tyre != 'Soft':
-                for t_data in val:
-                    times = [x-self.predict_fuel_time_lose(fuel)-self.predict_tyre_time_lose(tyre,lap)['Total'] for x, fuel, lap in zip(t_data['LapTime'].values, t_data['Fuel'].values, t_data['Lap'].values)]
-                    if all(t_data['DRS'] == False) and tyre not in ['Wet', 'Inter']:
-                        times = [x-self.drs_lose for x in times]
-                    best[tyre] = min(times) if math.isinf(best[tyre]) else (best[tyre]+min(times))/2
+
+        ### Soft is the reference of the other compounds, so it is computed first
+        for tyre in ['Soft'] + [tyre for tyre in stints.keys() if tyre != 'Soft']:
+            for stint in stints[tyre]:
+                times = stint['LapTime'] - self.predict_fuel_time_lose(stint['Fuel']) - self.predict_tyre_time_lose(tyre, stint['Lap'])['Total']
+                if not stint['DRS'].any() and tyre not in ['Wet', 'Inter']:
+                    times = times - self.drs_lose
+                best[tyre] = times.min() if math.isinf(best[tyre]) else (best[tyre]+times.min())/2
         
         for tyre, bestLap in best.items():
             if tyre == "Soft":
@@ -257,38 +271,40 @@ class Car:
         fig = px.line(df, x="Lap", y="TimeLost", color="Compound", title="Tyre Time Loss")
         fig.show()
 
+    def predict_fuel_consume(self, condition:str):
+        if condition == "Dry/Wet":
+            return (abs(self.fuel_consume_coeff["Dry"]) + abs(self.fuel_consume_coeff["Wet"]))/2
+        elif condition == "VWet":
+            return abs(self.fuel_consume_coeff["Wet"])
+        
+        return abs(self.fuel_consume_coeff[condition])
+
     def predict_starting_fuel(self, conditions:list):
         fuel = 0
         for condition in conditions:
-            if condition == "Dry/Wet":
-                fuel += (abs(self.fuel_consume_coeff["Dry"]) + abs(self.fuel_consume_coeff["Wet"]))/2
-            elif condition == "VWet":
-                fuel += abs(self.fuel_consume_coeff["Wet"])
-            else:
-                fuel += abs(self.fuel_consume_coeff[condition])
+            fuel += self.predict_fuel_consume(condition)
                 
         return fuel
     
     def predict_fuel_weight(self, init_fuel:float, conditions:list):
         weight = init_fuel
         for condition in conditions:
-            if condition == "Dry/Wet":
-                weight-= (abs(self.fuel_consume_coeff["Dry"]) + abs(self.fuel_consume_coeff["Wet"]))/2
-            elif condition == "VWet":
-                weight-= abs(self.fuel_consume_coeff["Wet"])
-            else:
-                weight-= abs(self.fuel_consume_coeff[condition])
+            weight-= self.predict_fuel_consume(condition)
         
         return weight
+
+    def predict_cumulative_fuel_consume(self, conditions:list):
+        ### Element k is the fuel burnt in the first k laps, so the fuel at lap k is a single subtraction
+        return np.concatenate(([0.0], np.cumsum([self.predict_fuel_consume(condition) for condition in conditions])))
         
     def predict_fuel_time_lose(self, fuel):
-        return round(self.fuel_lose * fuel)
+        return round_value(self.fuel_lose * fuel)
 
     def predict_tyre_wear(self, tyre:str, lap:int):
-        fl = round(self.tyre_wear_coeff[tyre]['FL'] * lap)
-        fr = round(self.tyre_wear_coeff[tyre]['FR'] * lap)
-        rl = round(self.tyre_wear_coeff[tyre]['RL'] * lap)
-        rr = round(self.tyre_wear_coeff[tyre]['RR'] * lap)
+        fl = round_value(self.tyre_wear_coeff[tyre]['FL'] * lap)
+        fr = round_value(self.tyre_wear_coeff[tyre]['FR'] * lap)
+        rl = round_value(self.tyre_wear_coeff[tyre]['RL'] * lap)
+        rr = round_value(self.tyre_wear_coeff[tyre]['RR'] * lap)
 
         return {'FL':fl, 'FR':fr, 'RL':rl, 'RR':rr}
 
@@ -296,10 +312,10 @@ class Car:
         if wear is None:
             wear = self.predict_tyre_wear(tyre, lap)
 
-        fl = round(self.tyre_coeff[tyre]['FL'] * wear['FL'])# * (wear['FL']*wear['FL']*1/100*1/100+1))
-        fr = round(self.tyre_coeff[tyre]['FR'] * wear['FR'])# * (wear['FR']*wear['FR']*1/100*1/100+1))
-        rl = round(self.tyre_coeff[tyre]['RL'] * wear['RL'])# * (wear['RL']*wear['RL']*1/100*1/100+1))
-        rr = round(self.tyre_coeff[tyre]['RR'] * wear['RR'])# * (wear['RR']*wear['RR']*1/100*1/100+1))
+        fl = round_value(self.tyre_coeff[tyre]['FL'] * wear['FL'])# * (wear['FL']*wear['FL']*1/100*1/100+1))
+        fr = round_value(self.tyre_coeff[tyre]['FR'] * wear['FR'])# * (wear['FR']*wear['FR']*1/100*1/100+1))
+        rl = round_value(self.tyre_coeff[tyre]['RL'] * wear['RL'])# * (wear['RL']*wear['RL']*1/100*1/100+1))
+        rr = round_value(self.tyre_coeff[tyre]['RR'] * wear['RR'])# * (wear['RR']*wear['RR']*1/100*1/100+1))
 
         return {'FL':fl, 'FR':fr, 'RL':rl, 'RR':rr, 'Total':fl+fr+rl+rr}
 
@@ -308,7 +324,11 @@ class Car:
         fuel_time_lose = self.predict_fuel_time_lose(self.predict_fuel_weight(start_fuel, conditions_str))
         tyre_wear_time_lose = self.predict_tyre_time_lose(tyre, tyre_age)['Total']
         drs_lose = self.drs_lose if drs else 0
+        weather_time = self.predict_weather_time_lose(tyre, conditions_int)
 
+        return round(self.time_diff['Soft'] + compound_time_lose + fuel_time_lose + tyre_wear_time_lose + drs_lose + weather_time)
+
+    def predict_weather_time_lose(self, tyre:str, conditions_int:int):
         weather_time = 0
 
         if conditions_int > 0:
@@ -327,52 +347,179 @@ class Car:
             if conditions_int < 60:
                 invert_conditions_wet = 60-conditions_int
                 weather_time = np.exp(invert_conditions_wet*0.06)*0.5 *1000
-            
-        
 
-        return round(self.time_diff['Soft'] + compound_time_lose + fuel_time_lose + tyre_wear_time_lose + drs_lose + weather_time)
+        return weather_time
 
     def save(self, path:str):
-        with open(os.path.join(path,"Car.json"), 'wb') as f:
-            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        params = {'Version': CAR_VERSION, 'Source': self.source}
+        params.update({key: to_builtin(getattr(self, key)) for key in CAR_PARAMETERS})
+        with open(os.path.join(path,"Car.json"), 'w') as f:
+            json.dump(params, f, indent=4)
     
-    def load(self, path:str):
+    def load(self, path:str) -> dict:
+        """
+        Returns the parameters saved in Car.json with their version, the cars pickled by the older versions are read as version 0.
+        """
         with open(os.path.join(path,"Car.json"), 'rb') as f:
-            data = pickle.load(f)
-        return data
+            raw = f.read()
+
+        if raw[:1] == b'{':
+            return json.loads(raw)
+
+        car = pickle.loads(raw)
+        params = {'Version': 0, 'Source': None}
+        params.update({key: getattr(car, key) for key in CAR_PARAMETERS})
+        return params
 
 def get_nearest_frame(df, frameList):
+    """
+    Aligns the frames of frameList to the frames of df: a frame is kept if df has it, otherwise it is moved to the next frame of df not used yet (never the last one).
+    Frames with no match are returned in toRemove. The frames of df are sorted once and every frame is matched by a binary search, the used positions
+    are skipped by jumping to the next free one (positions are joined as they are used, so every one is crossed once).
+    """
+    frames = np.unique(df['FrameIdentifier'].values).tolist()
+    nextFree = list(range(len(frames)+1))
+
+    def find(pos:int) -> int:
+        root = pos
+        while nextFree[root] != root:
+            root = nextFree[root]
+        while nextFree[pos] != root:
+            nextFree[pos], pos = root, nextFree[pos]
+        return root
+
     framesReturn = []
     toRemove = []
     for frame in frameList:
-        if frame in df['FrameIdentifier'].values:
+        pos = bisect.bisect_left(frames, frame)
+        if pos < len(frames) and frames[pos] == frame:
             framesReturn.append(frame)
+            nextFree[pos] = pos+1
+            continue
+
+        pos = find(pos)
+        if pos < len(frames)-1:
+            framesReturn.append(frames[pos])
+            nextFree[pos] = pos+1
         else:
-            notFound = True
-            add = 1
-            if frame > 40508:
-                pass
-            while notFound and ((frame + add) < max(df['FrameIdentifier'].values)):
-                if (frame + add) in framesReturn:
-                    pass
-                elif (frame + add) in df['FrameIdentifier'].values:
-                    framesReturn.append(frame + add)
-                    notFound = False
-                add += 1
-            
-            if notFound:
-                toRemove.append(frame)
+            toRemove.append(frame)
 
     return framesReturn, toRemove
 
-def get_data(folder:str, add_data:pd.DataFrame=None, ignore_frames:list=[], race=False):
+# Compact dtypes of the columns read from the session csv files (fuel is kept as double, the calibration of its coefficients depends on it)
+SESSION_DTYPES: dict = {
+    'FrameIdentifier': np.int32,
+    'CarIndex': np.int8,
+    'PlayerCarIndex': np.int8,
+    'DriverStatus': np.int8,
+    'CurrentLapNum': np.int16,
+    'LastLapTimeInMS': np.int32,
+    'DRS': np.int8,
+    'FuelInTank': np.float64,
+    'VisualTyreCompound': np.int8,
+    'TyresWearFL': np.float32,
+    'TyresWearFR': np.float32,
+    'TyresWearRL': np.float32,
+    'TyresWearRR': np.float32,
+}
+
+# Names of the visual compounds as a categorical dtype, so every session shares the same categories
+COMPOUND_DTYPE = pd.CategoricalDtype(sorted(set(VISUAL_COMPOUNDS.values())))
+
+# Function to read the columns of a session csv streaming it by chunks, only the rows of car_index are kept (all of them if it is None) so the memory used is bounded by the chunk size and not by the session size
+def read_session(path:str, columns:list, car_index:int=None, chunksize:int=100000) -> pd.DataFrame:
+    usecols = columns if car_index is None or 'CarIndex' in columns else ['CarIndex'] + columns
+    dtype = {col: SESSION_DTYPES[col] for col in usecols if col in SESSION_DTYPES}
+
+    chunks = []
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        if car_index is not None:
+            chunk = chunk.loc[chunk['CarIndex'] == car_index]
+        chunks.append(chunk[columns])
+
+    ### A session with only the header gives no chunks
+    if len(chunks) == 0:
+        return pd.DataFrame({col: pd.Series(dtype=dtype.get(col, object)) for col in columns})
+
+    return pd.concat(chunks, ignore_index=True)
+
+# Function to get the index of the car driven by the player, it is the same in every row of the session
+def player_car_index(folder:str) -> int:
+    return int(pd.read_csv(os.path.join(folder, "Lap.csv"), usecols=['PlayerCarIndex'], nrows=1)['PlayerCarIndex'].iloc[0])
+
+# Function to find the laps to drop from the laps of a session (index FrameIdentifier, sorted), it returns the reason of every lap ('' if it is kept)
+def detect_outlier_laps(lap:pd.DataFrame, race:bool=False, threshold:float=3.5, in_out_threshold:float=2.0, stint_gap:float=2.0) -> pd.Series:
+    """
+    Laps are split in stints where the lap number does not go on by one or the frames between two laps are more than stint_gap times the usual ones (the car was in the garage).
+    Every lap time is compared with the median of its stint in units of its median absolute deviation (robust z-score):
+    - of the laps with the same number only the closest one to the median is kept ('Duplicated')
+    - the first and the last lap of a stint are out and in laps if their z-score is over in_out_threshold ('OutLap', 'InLap')
+    - the other laps are anomalous if the absolute z-score is over threshold ('Anomalous')
+    In a race only the duplicated laps are dropped, pit stops and safety cars are part of it.
+    """
+    frames = lap.index.values
+    laps = lap['CurrentLapNum'].values.astype(np.int64)
+    times = lap['LastLapTimeInMS'].values.astype(float)
+    reasons = np.full(len(lap), '', dtype=object)
+    if len(lap) == 0:
+        return pd.Series(reasons, index=lap.index, name='Reason')
+
+    ### Stints start where the lap number jumps or where the car stood still longer than a lap
+    lap_diff = np.diff(laps, prepend=laps[0])
+    frame_diff = np.diff(frames, prepend=frames[0])
+    usual_gap = np.median(frame_diff[lap_diff == 1]) if np.any(lap_diff == 1) else np.inf
+    stint = np.cumsum((lap_diff < 0) | (lap_diff > 1) | (frame_diff > stint_gap * usual_gap))
+
+    ### Robust z-score of every lap in its stint, the deviation is at least 0.5% of the median so stints of equal laps do not flag everything
+    grouped = pd.Series(times).groupby(stint)
+    median = grouped.transform('median').values
+    mad = pd.Series(np.abs(times - median)).groupby(stint).transform('median').values
+    z = (times - median) / np.maximum(1.4826 * mad, 0.005 * median)
+
+    ### Laps with the same number are sorted by their distance from the median, the first one is kept
+    order = np.lexsort((np.abs(z), laps, stint))
+    duplicated = np.zeros(len(lap), dtype=bool)
+    duplicated[order] = pd.DataFrame({'Stint': stint[order], 'Lap': laps[order]}).duplicated().values
+    reasons[duplicated] = 'Duplicated'
+
+    if not race:
+        kept = np.flatnonzero(~duplicated)
+        first = kept[np.r_[True, stint[kept][1:] != stint[kept][:-1]]]
+        last = kept[np.r_[stint[kept][1:] != stint[kept][:-1], True]]
+        edge = np.zeros(len(lap), dtype=bool)
+        edge[first] = True
+        edge[last] = True
+
+        reasons[(~duplicated) & (~edge) & (np.abs(z) > threshold)] = 'Anomalous'
+        reasons[last[z[last] > in_out_threshold]] = 'InLap'
+        reasons[first[z[first] > in_out_threshold]] = 'OutLap'
+
+    return pd.Series(reasons, index=lap.index, name='Reason')
+
+# Function to show the laps with the decisions of detect_outlier_laps, the frames to drop can be changed by hand (ENTER keeps the ones detected)
+def review_laps(lap:pd.DataFrame, reasons:pd.Series) -> list:
+    to_drop = reasons.index[reasons != ''].tolist()
+    logger.info(f"Lap DataFrame is the following:")
+    for idx, row in lap.iterrows():
+        logger.info(f"{idx}, {row['CurrentLapNum']} -> {ms_to_time(row['LastLapTimeInMS'])} {reasons[idx]}")
+    logger.info(f"Frames detected to drop: {to_drop}")
+
+    frames = input("Press ENTER to drop the frames detected, otherwise insert the frames to drop separated by comma or 'none' if None: ").strip()
+    if frames.lower() == 'none':
+        to_drop = []
+    elif frames:
+        to_drop = np.array(frames.split(','), dtype=int).tolist()
+
+    return to_drop
+
+def get_data(folder:str, add_data:pd.DataFrame=None, ignore_frames:list=[], race=False, review:bool=False):
     if not os.path.isdir(folder):
         return add_data
 
-    lap = pd.read_csv(os.path.join(folder, "Lap.csv"))
-    car_index = lap['PlayerCarIndex'].unique()[0]
+    car_index = player_car_index(folder)
 
-    lap = lap.loc[(lap["CarIndex"] == car_index) & (lap['DriverStatus'] > 0) & (lap['LastLapTimeInMS'] > 0), ['CurrentLapNum', 'FrameIdentifier', 'LastLapTimeInMS']].drop_duplicates(['FrameIdentifier'], keep="last")#,'DriverStatus'
+    lap = read_session(os.path.join(folder, "Lap.csv"), ['CurrentLapNum', 'FrameIdentifier', 'LastLapTimeInMS', 'DriverStatus'], car_index)
+    lap = lap.loc[(lap['DriverStatus'] > 0) & (lap['LastLapTimeInMS'] > 0), ['CurrentLapNum', 'FrameIdentifier', 'LastLapTimeInMS']].drop_duplicates(['FrameIdentifier'], keep="last")
     lap = lap.drop_duplicates(['CurrentLapNum','LastLapTimeInMS'], keep='first').sort_values(by=['FrameIdentifier']).set_index("FrameIdentifier")
 
     to_drop = ignore_frames
@@ -380,17 +527,17 @@ def get_data(folder:str, add_data:pd.DataFrame=None, ignore_frames:list=[], race
         if os.path.isfile(os.path.join(folder, "to_drop.txt")):
             with open(os.path.join(folder, "to_drop.txt"), "r") as f:
                 to_drop = [int(x) for x in f.read().split(",")[:-1]]
+            if review:
+                logger.info(f"Laps of {folder} not reviewed: the frames to drop are read from to_drop.txt (delete it to review them)")
         
         else:
-            laps = lap['CurrentLapNum']
-            duplicated_laps = lap[laps.isin(laps[laps.duplicated()])].sort_values("FrameIdentifier")
-            logger.info(f"Lap DataFrame is the following:")
-            for idx, row in lap.iterrows():
-                logger.info(f"{idx}, {row['CurrentLapNum']} -> {ms_to_time(row['LastLapTimeInMS'])}")
-            logger.info(f"\nDuplicated ones are: {duplicated_laps}")
-            to_drop = input("If there are some wrong frames, insert now separated by comma or press ENTER if None: ")
-            if to_drop:
-                to_drop = np.array(to_drop.split(','), dtype=int)
+            ### The laps to drop are found automatically, they are shown to be changed only if a review is asked
+            reasons = detect_outlier_laps(lap, race=race)
+            to_drop = reasons.index[reasons != ''].tolist()
+            if review:
+                to_drop = review_laps(lap, reasons)
+            else:
+                logger.info(f"Laps dropped from {folder}: " + (", ".join([f"{frame} ({reason})" for frame, reason in reasons[reasons != ''].items()]) or "none"))
 
             with open(os.path.join(folder, "to_drop.txt"), "w") as f:
                 for frame in to_drop:
@@ -405,8 +552,7 @@ def get_data(folder:str, add_data:pd.DataFrame=None, ignore_frames:list=[], race
         lap.at[i,'CurrentLapNum'] = int(lap.at[i,'CurrentLapNum'])-sub
 
     lap_frames = lap.index.values
-    telemetry = pd.read_csv(os.path.join(folder, "Telemetry.csv"))
-    telemetry = telemetry.loc[telemetry["CarIndex"] == car_index, ['FrameIdentifier', 'DRS']].drop_duplicates(['FrameIdentifier'], keep="last")
+    telemetry = read_session(os.path.join(folder, "Telemetry.csv"), ['FrameIdentifier', 'DRS'], car_index).drop_duplicates(['FrameIdentifier'], keep="last")
     telemetry_frames, remove_frames = get_nearest_frame(telemetry, lap_frames)
     for frame in remove_frames:
         lap = lap.drop(frame)
@@ -416,22 +562,18 @@ def get_data(folder:str, add_data:pd.DataFrame=None, ignore_frames:list=[], race
     lap.index = telemetry_frames
     concatData = pd.concat([lap, telemetry], axis=1)
 
-    status = pd.read_csv(os.path.join(folder, "Status.csv"))
-    status = status.loc[status["CarIndex"] == car_index, ['FrameIdentifier','FuelInTank','VisualTyreCompound']].drop_duplicates(['FrameIdentifier'], keep="last")
+    status = read_session(os.path.join(folder, "Status.csv"), ['FrameIdentifier','FuelInTank','VisualTyreCompound'], car_index).drop_duplicates(['FrameIdentifier'], keep="last")
     status_frames, remove_frames = get_nearest_frame(status, concatData.index.values)
     for frame in remove_frames:
         concatData = concatData.drop(frame)
     
     status = status.loc[status['FrameIdentifier'].isin(status_frames), :].sort_values(by=['FrameIdentifier']).set_index("FrameIdentifier")
-    
-    for i in status.index:
-        status.at[i,'VisualTyreCompound'] = VISUAL_COMPOUNDS[status.at[i,'VisualTyreCompound']]
+    status['VisualTyreCompound'] = status['VisualTyreCompound'].map(VISUAL_COMPOUNDS).astype(COMPOUND_DTYPE)
 
     concatData.index = status_frames
     concatData = pd.concat([concatData, status], axis=1)
 
-    damage = pd.read_csv(os.path.join(folder, "Damage.csv"))
-    damage = damage.loc[damage["CarIndex"] == car_index, ['FrameIdentifier', 'TyresWearFL','TyresWearFR','TyresWearRL','TyresWearRR',]].drop_duplicates(['FrameIdentifier'], keep="last")
+    damage = read_session(os.path.join(folder, "Damage.csv"), ['FrameIdentifier', 'TyresWearFL','TyresWearFR','TyresWearRL','TyresWearRR'], car_index).drop_duplicates(['FrameIdentifier'], keep="last")
     damage_frames, remove_frames = get_nearest_frame(damage, concatData.index.values)
     for frame in remove_frames:
         concatData = concatData.drop(frame)
@@ -469,48 +611,142 @@ def get_data(folder:str, add_data:pd.DataFrame=None, ignore_frames:list=[], race
     return ret
 
 
-def get_car_data(path:str):
-    car = None
-    if os.path.isfile(os.path.join(path, 'Car.json')):
-        car = Car(load_path=path)
-    else:    
-        if os.path.isfile(os.path.join(path, 'Data.json')):
+# Files of the practice sessions the cache of the data is built from
+SESSIONS: list = ['FP1', 'FP2', 'FP3']
+SESSION_FILES: list = ['Lap.csv', 'Telemetry.csv', 'Status.csv', 'Damage.csv', 'to_drop.txt']
+# Files the data is read from when there are no sessions, in order of preference (pickle and csv of the older versions)
+LEGACY_FILES: list = ['Data.json', 'FullData.csv']
+
+# Columns of the table of the cache, the frame (index of the stints) is saved with them and the compound as the code of its name in the stints
+CACHE_COLUMNS: list = ['Lap', 'LapTime', 'DRS', 'Fuel', 'FLWear', 'FRWear', 'RLWear', 'RRWear']
+
+# Function to get the hash of the content of the session files of a circuit, it is None if there are no sessions
+def sessions_hash(path:str):
+    digest = hashlib.blake2b(digest_size=16)
+    found = False
+    for session in SESSIONS:
+        for name in SESSION_FILES:
+            file = os.path.join(path, session, name)
+            if not os.path.isfile(file):
+                continue
+
+            found = True
+            update_hash(digest, file, f"{session}/{name}")
+
+    return digest.hexdigest() if found else None
+
+# Function to get the hash of the file the practice data is read from when there are no sessions (the pickle or the csv of the older versions), None if there is none
+def legacy_hash(path:str):
+    for name in LEGACY_FILES:
+        file = os.path.join(path, name)
+        if os.path.isfile(file):
+            digest = hashlib.blake2b(digest_size=16)
+            update_hash(digest, file, name)
+            return digest.hexdigest()
+
+    return None
+
+# Function to add the name and the content of a file to a hash, the file is read in blocks
+def update_hash(digest, file:str, name:str):
+    digest.update(name.encode())
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+# Function to save the practice data (tyre -> list of stints) as one columnar table in Data.npz, together with the hash of the sessions it comes from
+def save_data_cache(path:str, data:dict, digest:str=None):
+    compounds = list(data.keys())
+    stints = [(compounds.index(tyre), stint) for tyre, val in data.items() for stint in val]
+    frame = pd.concat([stint for _, stint in stints])
+
+    ### Every column keeps its own dtype as a field of a single record array, so the cache is read with one header
+    table = np.empty(len(frame), dtype=[('Frame', np.int64)] + [(col, frame[col].dtype) for col in CACHE_COLUMNS])
+    table['Frame'] = frame.index.values
+    for col in CACHE_COLUMNS:
+        table[col] = frame[col].values
+
+    ### Hash, compounds, stints and the dtype of the table are a json of their own, both members are saved as bytes so their headers are trivial to parse
+    meta = {'Hash': digest, 'Compounds': compounds, 'Stints': [[code, len(stint)] for code, stint in stints], 'Dtype': [[name, table.dtype[name].str] for name in table.dtype.names]}
+    np.savez(os.path.join(path, 'Data.npz'), Meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), Table=table.view(np.uint8))
+
+# Function to load the practice data saved by save_data_cache, it is None if there is no cache or if it was made from other sessions (the table is not read in that case)
+# Stints are returned as the arrays of stint_arrays (plus the frames), slices of the columns of the table and not DataFrames
+def load_data_cache(path:str, digest:str=None):
+    file = os.path.join(path, 'Data.npz')
+    if not os.path.isfile(file):
+        return None
+
+    ### Members of the npz are read when they are accessed: the table is read (in full) only after the hash is checked
+    with np.load(file, allow_pickle=False) as cache:
+        ### Without a source there is nothing to compare with, the cache is the data
+        meta = json.loads(cache['Meta'].tobytes())
+        if digest is not None and meta['Hash'] != digest:
+            return None
+
+        table = cache['Table'].view(np.dtype([tuple(field) for field in meta['Dtype']]))
+
+    ### Stints are saved one after the other, each one is a slice of the columns
+    columns = {'Frame': table['Frame'], 'Lap': table['Lap'], 'LapTime': table['LapTime'], 'Fuel': table['Fuel'], 'DRS': table['DRS'] == True, 'Wear': np.stack([table[col] for col in ['FLWear', 'FRWear', 'RLWear', 'RRWear']], axis=1).astype(float)}
+    compounds = meta['Compounds']
+    data = {tyre: [] for tyre in compounds}
+    start = 0
+    for code, length in meta['Stints']:
+        data[compounds[code]].append({key: val[start:start+length] for key, val in columns.items()})
+        start += length
+
+    return data
+
+
+# Function to get the practice data of a circuit from the cache, it is rebuilt when its source changes (the pickle and the csv of the older versions are only read if there are no sessions)
+def get_practice_data(path:str, digest:str, from_sessions:bool, review:bool=False):
+    data = load_data_cache(path, digest)
+    if data is not None and review:
+        logger.info(f"Laps of {path} not reviewed: the practice data is read from the cache (delete Data.npz to review them)")
+
+    if data is None:
+        if from_sessions:
+            for session in SESSIONS:
+                data = get_data(os.path.join(path, session), add_data=data, review=review)
+
+        elif os.path.isfile(os.path.join(path, 'Data.json')):
             with open(os.path.join(path, 'Data.json'), 'rb') as f:
                 data = pickle.load(f)
 
-        else:   
-            if os.path.isfile(os.path.join(path, 'FullData.csv')):
-                data_load = pd.read_csv(os.path.join(path, 'FullData.csv'))
-                data = dict()
-                for tyre in data_load['Compound'].unique():
-                    data[tyre] = [data_load.loc[data_load['Compound'] == tyre, :]]
-                with open(os.path.join(path, 'Data.json'), 'wb') as f:
-                    pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
-            else:
-                fp1_folder = os.path.join(path, 'FP1')
-                fp2_folder = os.path.join(path, 'FP2')
-                fp3_folder = os.path.join(path, 'FP3')
-                
-                fp1 = get_data(fp1_folder, add_data=None)
-                fp2 = get_data(fp2_folder, add_data=fp1)
-                fp3 = get_data(fp3_folder, add_data=fp2)
-
-                concatenated = None
-                for _, item in fp3.items():
-                    for i in item:
-                        if concatenated is None:
-                            concatenated = i
-                        else:
-                            concatenated = pd.concat([concatenated, i])
-                
-                concatenated.to_csv(os.path.join(path, 'FullData.csv'), index=False)
+        elif os.path.isfile(os.path.join(path, 'FullData.csv')):
+            data_load = pd.read_csv(os.path.join(path, 'FullData.csv'))
+            data = dict()
+            for tyre in data_load['Compound'].unique():
+                data[tyre] = [data_load.loc[data_load['Compound'] == tyre, :]]
+
+        if data is not None:
+            save_data_cache(path, data, digest)
+
+    return data
 
-                with open(os.path.join(path, 'Data.json'), 'wb') as f:
-                    pickle.dump(fp3, f, pickle.HIGHEST_PROTOCOL)
+def get_car_data(path:str, review:bool=False, seed=None):
+    ### The source of the car is the hash of the files of the practice data: the sessions, or the pickle and the csv of the older versions if there are none
+    digest = sessions_hash(path)
+    from_sessions = digest is not None
+    if not from_sessions:
+        digest = legacy_hash(path)
 
-                data = fp3.copy()
-            
-        car = Car(data=data)
+    car = None
+    if os.path.isfile(os.path.join(path, 'Car.json')):
+        ### Only the parameters are read, the practice data is not loaded if the car was calibrated on the same source
+        ### Cars of another schema or of another source are calibrated again, pickles of the older versions have no source: they are kept and saved again in this form
+        car = Car(load_path=path)
+        if car.version not in (0, CAR_VERSION) or (car.version != 0 and digest is not None and car.source != digest):
+            car = None
+        elif car.version == 0:
+            car.source = digest
+            car.save(path)
+
+        if car is not None and review:
+            logger.info(f"Laps of {path} not reviewed: the car is already calibrated on the same data (delete Car.json to review them)")
+
+    if car is None:
+        car = Car(data=get_practice_data(path, digest, from_sessions, review), seed=seed)
+        car.source = digest
         car.save(path)
         
     return car
@@ -1,39 +1,27 @@
 import os
-import copy
+import json
 import math 
 import time
+import hashlib
 import logging
 import numpy as np
-import pandas as pd
 
 from tqdm import tqdm
-from random import SystemRandom
+from collections import OrderedDict
+from multiprocessing import Value
+from concurrent.futures import ProcessPoolExecutor
 
 from classes.Car import Car
 from classes.Weather import Weather
-from classes.Utils import CIRCUIT, Log, ms_to_time, get_basic_logger
+from classes.Strategy import Strategy
+from classes.Profiler import Profiler
+from classes.Statistics import Statistics
+from classes.Utils import CIRCUIT, COMPOUNDS, Log, ms_to_time, get_basic_logger
 
-random = SystemRandom()
 logger = get_basic_logger('Genetic', logging.INFO)
 
-TYRE_WEAR_THRESHOLD = 0.3
-BEST_TIME = np.inf
-STRATEGY = None
-
-def boxplot_insert(data_list:list, population:list):
-    population = sorted(population, key=lambda x: x['TotalTime'])
-
-    fitnesses = list()
-
-    for strategy in population:
-        timing = strategy['TotalTime']
-        if strategy['Valid'] and timing > 0:
-            fitnesses.append(strategy['TotalTime'])
-        else:
-            fitnesses.append(np.nan)
-            
-    data_list.append(fitnesses)
-    return data_list
+WORKER_SOLVER = None
+WORKER_INCUMBENT = None
 
 def orderOfMagnitude(number):
     order = 0
@@ -57,19 +45,23 @@ def overLimit(values, limit):
     
     return False
 
-def changeTyre(tyresWear:dict):
-    if all([x < TYRE_WEAR_THRESHOLD for x in tyresWear.values()]):
-        return False
+# Function run once by every worker of the pool, the solver (with car and lookup tables) and the shared incumbent of the bruteforce are kept for all the tasks
+def initWorker(solver, incumbent=None):
+    global WORKER_SOLVER, WORKER_INCUMBENT
+    WORKER_SOLVER = solver
+    WORKER_INCUMBENT = incumbent
 
-    boundary = random.random()
-    for wear in tyresWear.values():
-        if boundary < wear*2:
-            return True
-    return False
+# Function run by the workers to build the offspring of a couple of parents
+def offspringWorker(parents:tuple, seed:np.random.SeedSequence):
+    return WORKER_SOLVER.buildOffspring(parents[0], parents[1], seed)
+
+# Function run by the workers to explore a subtree of the bruteforce
+def bruteforceWorker(prefix:tuple, max_pit_stops:int):
+    return WORKER_SOLVER.branch_and_bound(prefix, max_pit_stops=max_pit_stops, incumbent=WORKER_INCUMBENT)
 
 class GeneticSolver:
 
-    def __init__(self, population:int=2, mutation_pr:float=0.75, crossover_pr:float=0.5, iterations:int=1, car:Car=None, circuit:str='', weather:str='', save_path:str='') -> None:
+    def __init__(self, population:int=2, mutation_pr:float=0.75, crossover_pr:float=0.5, iterations:int=1, car:Car=None, circuit:str='', weather:str='', save_path:str='', cache_size:int=100000, workers:int=1, seed:int=None, log_policy:str='overwrite') -> None:
         self.circuit = circuit
         self.pitStopTime = CIRCUIT[circuit]['PitStopTime']
         self.availableTyres:dict = dict()
@@ -83,80 +75,167 @@ class GeneticSolver:
 
         ### For the log file
         self.path = save_path
-        self.log = Log(save_path, values={'Circuit':circuit, 'Weather': self.weather.filename, 'PitStopTime':self.pitStopTime, 'Mutation': mutation_pr, 'Crossover': crossover_pr, 'Population': population, 'Iterations':iterations})
+        self.log = Log(save_path, values={'Circuit':circuit, 'Weather': self.weather.filename, 'PitStopTime':self.pitStopTime, 'Mutation': mutation_pr, 'Crossover': crossover_pr, 'Population': population, 'Iterations':iterations, 'CacheSize':cache_size}, policy=log_policy)
         
         self.mu_decay = 0.99
         self.sigma_decay = 0.99
+
+        ### Offspring are built by a pool of processes if workers > 1, every couple of parents gets its own child stream of the seed so the result is the same of the serial run
+        self.workers = workers
+        self.seedSequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.random = np.random.default_rng(self.seedSequence)
+
+        ### Lookup tables of the car model, they are built once since car, weather and circuit do not change during the run
+        self.fuelConsumption = self.car.predict_cumulative_fuel_consume(self.weather.get_weather_list()[:self.numLaps])
+        self.tyreWearTable = self.buildTyreWearTable()
+        self.lapTimeTable = self.buildLapTimeTable()
+
+        ### Longest stint of each compound: the lap after the first one with a tyre worn over 80% a pit stop is forced
+        worn = (self.tyreWearTable >= 0.8).any(axis=2)
+        self.maxStintLength = np.where(worn.any(axis=1), worn.argmax(axis=1) + 1, self.numLaps)
+
+        ### Evaluations already made, keyed by genome and kept in least recently used order (a size of 0 disables the cache)
+        self.cacheSize = cache_size
+        self.fitnessCache = OrderedDict()
+        self.cacheHits = 0
+        self.cacheMisses = 0
+
+        ### Number of lap times and fuel loads computed by the model (a vectorized call counts every lap)
+        self.lapTimeCalls = 0
+        self.fuelLoadCalls = 0
+
+        ### Tables of the bruteforce, built on its first use
+        self.bruteforceTables = None
     
 
-    # Function to run the algorithm
-    def run(self,bf_time:int=0):
+    # Function to get the state sent to the workers, the fitness cache and the random generator stay in the main process
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['fitnessCache'] = OrderedDict()
+        state['random'] = None
+
+        return state
+    
+
+    # Function to build the tyre wear table indexed by [compound, tyre age, wheel] (wheels are FL, FR, RL, RR)
+    def buildTyreWearTable(self,):
+        table = np.zeros((len(COMPOUNDS), self.numLaps, 4))
+
+        for c, compound in enumerate(COMPOUNDS):
+            for age in range(1, self.numLaps):
+                wear = self.car.predict_tyre_wear(compound, age)
+                table[c, age] = [wear['FL']/100, wear['FR']/100, wear['RL']/100, wear['RR']/100]
+
+        return table
+
+
+    # Function to build the lap time table indexed by [compound, tyre age, lap, pit stop]
+    def buildLapTimeTable(self,):
+        weather = self.weather.get_weather_percentage_list()
+        table = np.zeros((len(COMPOUNDS), self.numLaps, self.numLaps, 2))
+
+        for c, compound in enumerate(COMPOUNDS):
+            compound_time_lose = self.car.time_diff[compound] if compound != 'Soft' else 0
+            tyre_time_lose = np.array([self.car.predict_tyre_time_lose(compound, age)['Total'] for age in range(self.numLaps)])
+            weather_time_lose = np.array([self.car.predict_weather_time_lose(compound, weather[lap]) for lap in range(self.numLaps)])
+            table[c] = (self.car.time_diff['Soft'] + compound_time_lose + np.add.outer(tyre_time_lose, weather_time_lose))[:, :, None]
+
+        ### Pit stop and first lap (standing start) penalties
+        table[:, :, :, 1] += self.pitStopTime
+        table[:, :, 0, :] += 2000
+
+        ### The fuel component depends on the fuel load of each strategy, so it is added by getLapTime
+        return table
+
+
+    # Function to run the algorithm, migrate(gen, population) is called at every generation by the island model to exchange individuals
+    # The time of every phase is kept in self.profiler (and saved in Stats.json if save_stats)
+    def run(self,bf_time:int=0, migrate=None, save_stats:bool=False):
         start_timer = time.time()
+        profiler = Profiler(self.iterations)
+        statistics = Statistics(self.iterations, os.path.join(self.path, 'Boxplot.csv'))
+        calls = (self.lapTimeCalls, self.fuelLoadCalls, self.cacheHits, self.cacheMisses)
 
         fitness_values = dict()
         stuck_counter = 0
-        boxplot_list = list()
         prev = {}
 
         ### Initial population of random bitstring
         population = self.initSolver()
 
+        ### Workers receive the solver once at startup
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=initWorker, initargs=(self,)) if self.workers > 1 else None
+
         print(f"\n-------------------------------------------------------------\nData for '{self.circuit}':\n\nPopulation = {self.population}\nIterations = {self.iterations}\nMutation = {self.sigma}\nCrossover = {self.mu}\nWeather = {self.weather.filename}\n-------------------------------------------------------------\n")
         
         ### Enumerate generations
         try:
             bar = tqdm(range(self.iterations))
             for gen in bar:
+                profiler.mark()
                 
-                ### Checking if there are duplicates, if so, we remove them
-                to_pop = []
-                for i in range(0, len(population)-1):
-                    for j in range(i+1, len(population)):
-                        if population[i] == population[j] and j not in to_pop:
-                            to_pop.append(j)
-
-                ### Removing duplicates by sorted indexes would return an error (we are changing length of the list) so we remove them in reversed order
-                to_pop = sorted(to_pop, reverse=True)
-                for i in to_pop:
-                    population.pop(i)
+                ### Checking if there are duplicates, if so, we remove them (the first occurrence of every genome is kept)
+                genomes = set()
+                unique = []
+                for strategy in population:
+                    genome = strategy.genome()
+                    if genome not in genomes:
+                        genomes.add(genome)
+                        unique.append(strategy)
+                population = unique
+                profiler.record(gen, 'Dedup')
                 
-                ### Gathering the first solution from population at gen^th generation
+                ### Evaluating the population (the offspring of the previous generation) in one batch and gathering the best solution at gen^th generation
                 if gen == 0:
                     best, best_eval = self.getBest(population)
                 else:
                     best, best_eval = self.getBest(population, best)
 
-                ### Storing data for boxplot
-                boxplot_list = boxplot_insert(boxplot_list, population)
+                profiler.record(gen, 'Evaluation')
+
+                ### Storing the statistics of the generation for the boxplot
+                statistics.insert(population)
+                profiler.record(gen, 'Logging')
+
+                ### Exchange the best individuals with the other islands
+                if migrate is not None:
+                    population = migrate(gen, population)
+                    profiler.mark()
 
                 ### Select parents
                 selected = self.selection_dynamic_penalty(step=gen+1,population=population,threshold_quantile=2/13, best = best_eval)
+                profiler.record(gen, 'Selection')
                 
-                 ### Set as parents the selected individuals
-                parents = copy.deepcopy(selected)
+                ### Set as parents the selected individuals, operators build new children from them and never change them
+                parents = selected
+                
+                ### Parents are part of the new children as they are
+                children = list(parents)
+
+                ### Crossover and mutation steps, serially or on the pool (children come back in the same order)
+                couples = [(parents[i], parents[i+1]) for i in range(0, len(parents)-1, 2)]
+                seeds = self.seedSequence.spawn(len(couples))
+                if pool is None:
+                    offspring = map(self.buildOffspring, [p1 for p1, _ in couples], [p2 for _, p2 in couples], seeds)
+                else:
+                    offspring = pool.map(offspringWorker, couples, seeds, chunksize=max(1, len(couples)//(4*self.workers)))
                 
-                ### Make a copy of the parents as new children
-                children = copy.deepcopy(parents)
-
-                ### Crossover and mutation steps
-                for i in range(0, len(parents)-1, 2): 
-                    p1, p2 = copy.deepcopy(parents[i]), copy.deepcopy(parents[i+1])
-
-                    for c in self.crossover(p1, p2):
-                        children.append(c)
-                    
-                    for l in self.mutation(parents[i]):
-                        children.append(l)
-                    
-                    for l in self.mutation(parents[i+1]):
-                        children.append(l)
+                ### Crossover and mutation are timed by the task, on the pool they are the time spent by the workers and their model calls are added here
+                for c, (crossoverTime, mutationTime, lapTimeCalls, fuelLoadCalls) in offspring:
+                    children.extend(c)
+                    profiler.add(gen, 'Crossover', crossoverTime)
+                    profiler.add(gen, 'Mutation', mutationTime)
+                    if pool is not None:
+                        self.lapTimeCalls += lapTimeCalls
+                        self.fuelLoadCalls += fuelLoadCalls
+                profiler.mark()
 
                 ### Add random children to the population if the population is not full
-                for _ in range(self.population-len(children)):
-                    children.append(self.randomChild())
+                children.extend(self.randomChildren(self.population-len(children)))
                 
                 ### Replace old population
-                population = copy.deepcopy(children)
+                population = children
+                profiler.record(gen, 'RandomFill')
 
                 if prev == best_eval:
                     stuck_counter += 1
@@ -176,27 +255,43 @@ class GeneticSolver:
                     stuck_counter = 0
                     quarter_pop = self.population//4
                     population = population[:self.population]
-                    idx = random.randint(1, quarter_pop)
+                    idx = int(self.random.integers(1, quarter_pop+1))
                     threshold_quantile = round(threshold_quantile - 0.05,2)
-                    for i in range(3*quarter_pop+idx, self.population):
-                        population[i] = self.randomChild()
+                    population[3*quarter_pop+idx:] = self.randomChildren(self.population-3*quarter_pop-idx)
+                    profiler.record(gen, 'RandomFill')
                 
                 if threshold_quantile <= 0.01 or threshold_quantile >= 0.99:
-                    threshold_quantile = round(random.uniform(0.3,0.99),2)
+                    threshold_quantile = round(float(self.random.uniform(0.3,0.99)),2)
 
-                valid_strategies = round(((sum([1 for x in children if x['Valid'] == True]))/len(children))*100,2)
+                valid_strategies = round(((sum([1 for x in children if x.valid == True]))/len(children))*100,2)
                 bar.set_description(f"Best: {ms_to_time(best_eval)}, Difference: {ms_to_time(best_eval-bf_time)}, Threshold: {threshold_quantile}, Stuck: {stuck_counter}, Valid strategies: {valid_strategies}%")
                 bar.refresh()
                 string = f'[EA] Generation {gen+1} - Bruteforce solution: {ms_to_time(bf_time)} -> best overall: {ms_to_time(best_eval)} - difference: {ms_to_time(best_eval-bf_time)} - valid strategies: {valid_strategies}% | threshold is {threshold_quantile} - Stuck Counter = {stuck_counter}/{(self.iterations)//100}'
                 self.log.write(string+"\n")
+                self.log.metrics({'Generation': gen+1, 'Best': int(best_eval) if not math.isinf(best_eval) else None, 'Difference': int(best_eval-bf_time) if not math.isinf(best_eval) else None, 'ValidStrategies': valid_strategies, 'Threshold': threshold_quantile, 'StuckCounter': stuck_counter, 'Elapsed': round(time.time()-start_timer, 3)})
+                profiler.record(gen, 'Logging')
                 
         except KeyboardInterrupt:
             pass 
+        
+        finally:
+            self.log.flush()
+            statistics.close()
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
 
         end_timer = time.time() - start_timer
 
+        profiler.elapsed = end_timer
+        profiler.counters = {'LapTimes': self.lapTimeCalls - calls[0], 'FuelLoads': self.fuelLoadCalls - calls[1], 'CacheHits': self.cacheHits - calls[2], 'CacheMisses': self.cacheMisses - calls[3]}
+        if save_stats:
+            profiler.save(os.path.join(self.path, 'Stats.json'))
+
         fit_dict = {'Generation' : list(fitness_values.keys()), 'Fitness' : list(fitness_values.values())}
 
+        ### Reports (and the local search) work on the dictionary format of the strategy
+        best = best.to_dict()
+
         strategy_path = os.path.join(self.path, 'Strategy.txt')
         
         string = f"Best Strategy fitness: {best_eval}\nBest Strategy time: {ms_to_time(best_eval)}\n\n vs \n\nBruteforce fitness: {bf_time}\nBruteforce time: {ms_to_time(bf_time)}\n\n\n"
@@ -209,161 +304,229 @@ class GeneticSolver:
         
         string += f"Time elapsed: {ms_to_time(round(end_timer*1000))}\n"
         
+        lookups = max(1, self.cacheHits + self.cacheMisses)
+        string += f"Fitness cache: {self.cacheHits} hits, {self.cacheMisses} misses ({round(100*self.cacheHits/lookups,2)}% hit rate)\n"
+        string += profiler.summary()
+        
         print("\n\n"+string)
         self.log.write("\n\n"+string)
+        self.log.close()
 
-        boxplot_df = pd.DataFrame(index=range(len(boxplot_list)))
-        for i in range(max([len(x) for x in boxplot_list])):
-            for j in range(len(boxplot_list)):
-                try:
-                    boxplot_df.at[i,j] = boxplot_list[j][i]
-                except:
-                    pass
+        ### Boxplot.csv has already been written generation by generation
+        boxplot_df = statistics.to_frame()
 
-        boxplot_df.to_csv(os.path.join(self.path,'Boxplot.csv'))
+        self.profiler = profiler
 
         return best, best_eval, boxplot_df, fit_dict, end_timer
     
 
     # Function to initialize the population
     def initSolver(self,):
-        strategies = []
-        for _ in range(self.population):
-            strategies.append(self.randomChild())
-
-        return strategies
+        return self.randomChildren(self.population)
     
 
     # Function to build a random strategy
     def randomChild(self):
-        strategy = {'TyreCompound': [], 'TyreAge':[], 'TyreWear':[] , 'FuelLoad':[] , 'PitStop': [], 'LapTime':[], 'NumPitStop': 0, 'Weather':self.weather.get_weather_percentage_list(), 'Valid':False, 'TotalTime': np.inf}
+        return self.randomChildren(1)[0]
+    
 
-        weather = strategy['Weather'][:1]
+    # Function to build n random strategies, the random values of all of them are drawn at once
+    def randomChildren(self, n:int) -> list:
+        if n <= 0:
+            return []
 
-        ### Get a random compound
-        compound = self.randomCompound()
-        strategy['TyreCompound'].append(compound)
-        tyresAge = 0 
-        strategy['TyreAge'].append(tyresAge)
-        strategy['TyreWear'].append(self.getTyreWear(compound, tyresAge))
-
-        ### The fuel load can be inferred by the coefficient of the fuel consumption, we add a random value between -10 and 10 to get a little variation
-        initialFuelLoad = round(random.uniform(0,110),2)
-        strategy['FuelLoad'].append(initialFuelLoad)
-
-        ### At first lap the pit stop is not made (PitStop list means that at lap i^th the pit stop is made at the beginning of the lap)
-        strategy['PitStop'].append(False)
-
-        ### Compute lapTime
-        strategy['LapTime'].append(self.getLapTime(compound=compound, compoundAge=tyresAge, lap=0, fuel_load=initialFuelLoad, conditions=weather, drs=False, pitStop=False))
-
-        ### For every lap we repeat the whole process
-        for lap in range(1,self.numLaps):
-            weather = strategy['Weather'][:lap+1]
-
-            ### The fuel does not depend on the compound and/or pit stops => we compute it and leave it here
-            fuelLoad = self.getFuelLoad(initial_fuel=initialFuelLoad, conditions=weather)
-            strategy['FuelLoad'].append(fuelLoad)
-
-            newTyre = random.choice([True, False])
-
-            if newTyre:
-                compound = self.randomCompound()
-                tyresAge = 0
-                pitStop = True
-                strategy['NumPitStop'] += 1
-            else: 
-                compound = strategy['TyreCompound'][lap-1]
-                tyresAge += 1
-                pitStop = False
-            
-                
-            strategy['TyreAge'].append(tyresAge)
-            strategy['TyreCompound'].append(compound)
-            strategy['TyreWear'].append(self.getTyreWear(compound, tyresAge))
-            strategy['PitStop'].append(pitStop)
-            strategy['LapTime'].append(self.getLapTime(compound=compound, compoundAge=tyresAge, lap=lap, fuel_load=fuelLoad, conditions=weather, drs=False, pitStop=pitStop))
-           
-        strategy['TotalTime'] = sum(strategy['LapTime'])
-        return strategy
+        laps = np.arange(self.numLaps)
+
+        ### Starting compound and fuel of every strategy, then for every lap if new tyres are mounted and which compound (at lap 0 the pit stop is never made)
+        initialFuelLoads = np.round(self.random.uniform(0, 110, size=n), 2)
+        pitStops = np.zeros((n, self.numLaps), dtype=bool)
+        pitStops[:, 1:] = self.random.random((n, self.numLaps-1)) < 0.5
+        mounted = self.random.integers(len(COMPOUNDS), size=(n, self.numLaps)).astype(np.int8)
+
+        ### Every lap uses the compound mounted at the last tyre change, the age of the tyres is the distance from it
+        lastChange = np.maximum.accumulate(np.where(pitStops, laps, 0), axis=1)
+        compounds = np.take_along_axis(mounted, lastChange, axis=1)
+        ages = (laps - lastChange).astype(np.int16)
+
+        ### The fuel does not depend on the compound and/or pit stops
+        fuelLoads = np.round(initialFuelLoads[:, None] - self.fuelConsumption[:self.numLaps], 2)
+        fuelLoads[:, 0] = initialFuelLoads
+        self.fuelLoadCalls += fuelLoads.size
+
+        tyreWears = self.tyreWearTable[compounds, ages].astype(np.float32)
+        lapTimes = self.getLapTimes(compounds, ages, laps, fuelLoads, pitStops)
+        totalTimes = lapTimes.sum(axis=1, dtype=np.int64)
+        numPitStops = pitStops.sum(axis=1)
+
+        ### Strategies get copies of their rows, a view would keep the arrays of the whole batch alive as long as any of them survives
+        weather = self.weather.get_weather_percentage_list()
+        strategies = []
+        for i in range(n):
+            strategy = Strategy.__new__(Strategy)
+            strategy.tyreCompound = compounds[i].copy()
+            strategy.tyreAge = ages[i].copy()
+            strategy.tyreWear = tyreWears[i].copy()
+            strategy.fuelLoad = fuelLoads[i].copy()
+            strategy.pitStop = pitStops[i].copy()
+            strategy.lapTime = lapTimes[i].copy()
+            strategy.numPitStop = int(numPitStops[i])
+            strategy.weather = weather
+            strategy.valid = False
+            strategy.totalTime = int(totalTimes[i])
+            strategies.append(strategy)
+
+        return strategies
     
 
-    # Function to get a random compound
+    # Function to get a random compound code
     def randomCompound(self,):
-        return random.choice(['Soft', 'Medium', 'Hard','Inter','Wet'])
+        return int(self.random.integers(len(COMPOUNDS)))
     
 
-    # Function to get the TyreWear given the compound and the lap
-    def getTyreWear(self, compound:str, lap:int):
-        if lap == 0:
-            return {'FL':0.0, 'FR':0.0, 'RL':0.0, 'RR':0.0}
-
-        wear = self.car.predict_tyre_wear(compound, lap)
+    # Function to get the TyreWear given the compound code and the lap
+    def getTyreWear(self, compound:int, lap:int):
+        fl, fr, rl, rr = self.tyreWearTable[compound, lap].tolist()
         
-        for key, val in wear.items():
-            wear[key] = val/100
-        
-        return wear
+        return {'FL':fl, 'FR':fr, 'RL':rl, 'RR':rr}
     
 
-    # Function for computing the lap time 
-    def getLapTime(self, compound:str, compoundAge:int, lap:int, fuel_load:float, conditions:list, drs:bool, pitStop:bool) -> int:
-        conditions_int = conditions[-1]
-        conditions_str = [self.weather.get_weather_string(c) for c in conditions[:-1]]
+    # Function for computing the lap time given the compound code, the weather of the lap is the one of the circuit at that lap
+    def getLapTime(self, compound:int, compoundAge:int, lap:int, fuel_load:float, pitStop:bool) -> int:
+        self.lapTimeCalls += 1
+        fuel_time_lose = self.car.predict_fuel_time_lose(fuel_load - self.fuelConsumption[lap])
+
+        return round(self.lapTimeTable[compound, compoundAge, lap, int(pitStop)] + fuel_time_lose)
+    
 
-        time = self.car.predict_laptime(tyre=compound, tyre_age=compoundAge, lap=lap, start_fuel=fuel_load, conditions_str=conditions_str, conditions_int=conditions_int, drs=drs)
+    # Function for computing the lap times of many laps at once, arguments are arrays broadcast together as in getLapTime
+    def getLapTimes(self, compounds:np.ndarray, ages:np.ndarray, laps:np.ndarray, fuelLoads:np.ndarray, pitStops:np.ndarray) -> np.ndarray:
+        ### Same computation of getLapTime, np.round rounds half to even as round does
+        fuel_time_lose = np.round(self.car.fuel_lose * (fuelLoads - self.fuelConsumption[laps]))
 
-        if pitStop:
-            time += self.pitStopTime
+        lapTimes = np.round(self.lapTimeTable[compounds, ages, laps, pitStops.astype(int)] + fuel_time_lose).astype(np.int32)
+        self.lapTimeCalls += lapTimes.size
 
-        if lap == 0:
-            time += 2000
+        return lapTimes
+    
 
-        return round(time) 
+    # Function to get the fuel load at the beginning of the lap (lap = numLaps gives the fuel left at the end of the race)
+    def getFuelLoad(self, initial_fuel:float, lap:int) :
+        self.fuelLoadCalls += 1
+        return round(initial_fuel - self.fuelConsumption[lap], 2)
     
 
-    # Function to get the fuel load
-    def getFuelLoad(self, initial_fuel:float, conditions:list) :
-        weather = [self.weather.get_weather_string(c) for c in conditions[:-1]]
-        return round(self.car.predict_fuel_weight(initial_fuel, weather), 2)
+    # Function to get the fuel load at the beginning of every lap given the initial one
+    def getFuelLoads(self, initial_fuel:float) -> np.ndarray:
+        fuelLoads = np.round(initial_fuel - self.fuelConsumption[:self.numLaps], 2)
+        self.fuelLoadCalls += self.numLaps
+        fuelLoads[0] = initial_fuel
+
+        return fuelLoads
     
 
     # Function to get the best individual/strategy in the population
-    def getBest(self, population:list, best={'TotalTime':np.inf}):
-        
-        for strategy in population:
-            self.checkValidity(strategy)
-            
-            if strategy['Valid']:
-                if strategy['TotalTime'] < best['TotalTime']:
-                    best = strategy
+    def getBest(self, population:list, best:Strategy=None):
+        totalTimes, valid = self.evaluatePopulation(population)
+
+        if valid.any():
+            ### argmin returns the first of the best ones as the sequential scan did
+            idx = np.flatnonzero(valid)[np.argmin(totalTimes[valid])]
+            if best is None or totalTimes[idx] < best.totalTime:
+                best = population[idx]
                 
-        return best, best['TotalTime']
+        return best, best.totalTime if best is not None else np.inf
+    
+
+    # Function to evaluate the whole population, strategies already in the cache are not simulated again
+    def evaluatePopulation(self, population:list):
+        totalTimes = np.zeros(len(population), dtype=np.int64)
+        valid = np.zeros(len(population), dtype=bool)
+        missing = []
+
+        for idx, strategy in enumerate(population):
+            genome = strategy.genome()
+            cached = self.fitnessCache.get(genome)
+            if cached is None:
+                missing.append(idx)
+                continue
+            
+            self.fitnessCache.move_to_end(genome)
+            strategy.lapTime, strategy.totalTime, strategy.valid = cached
+            totalTimes[idx], valid[idx] = cached[1], cached[2]
+        
+        self.cacheHits += len(population) - len(missing)
+        self.cacheMisses += len(missing)
+
+        if len(missing) == 0:
+            return totalTimes, valid
+
+        lapTimes, totalTimes[missing], valid[missing] = self.simulatePopulation([population[idx] for idx in missing])
+
+        ### Lap times arrays are shared among strategies and with the cache, so they are read only (operators detach them before changing them)
+        for row, idx in enumerate(missing):
+            strategy = population[idx]
+            strategy.lapTime = lapTimes[row].copy()
+            strategy.lapTime.flags.writeable = False
+            strategy.totalTime = int(totalTimes[idx])
+            strategy.valid = bool(valid[idx])
+
+            if self.cacheSize > 0:
+                self.fitnessCache[strategy.genome()] = (strategy.lapTime, strategy.totalTime, strategy.valid)
+        
+        while len(self.fitnessCache) > self.cacheSize:
+            self.fitnessCache.popitem(last=False)
+
+        return totalTimes, valid
+    
+
+    # Function to simulate many strategies at once: lap times, total times and validity are computed on (population x laps) matrices
+    def simulatePopulation(self, population:list):
+        compounds = np.stack([strategy.tyreCompound for strategy in population])
+        ages = np.stack([strategy.tyreAge for strategy in population])
+        pitStops = np.stack([strategy.pitStop for strategy in population])
+        fuelLoads = np.stack([strategy.fuelLoad for strategy in population])
+
+        lapTimes = self.getLapTimes(compounds, ages, np.arange(self.numLaps), fuelLoads, pitStops)
+        totalTimes = lapTimes.sum(axis=1)
+
+        ### Validity: the fuel must last for the whole race and in dry races more than one compound must be used
+        last_lap_fuel_load = np.round(fuelLoads[:, 0] - self.fuelConsumption[self.numLaps], 2)
+        self.fuelLoadCalls += len(population)
+        usedCompounds = np.zeros((len(population), len(COMPOUNDS)), dtype=bool)
+        usedCompounds[np.arange(len(population))[:, None], compounds] = True
+
+        if any([x != 0 for x in self.weather.get_weather_percentage_list()]):
+            ### If weather is not completely Dry the constraint of changing tyre does not apply anymore
+            valid = last_lap_fuel_load >= 0
+        else:
+            valid = (usedCompounds.sum(axis=1) > 1) & (last_lap_fuel_load >= 0)
+
+        return lapTimes, totalTimes, valid
     
 
     # Function for checking the validity of a strategy
-    def checkValidity(self, strategy:dict):
-        all_compounds = set(strategy['TyreCompound'])
-        last_lap_fuel_load = self.getFuelLoad(strategy['FuelLoad'][0], strategy['Weather'])
+    def checkValidity(self, strategy:Strategy):
+        all_compounds = set(strategy.tyreCompound.tolist())
+        last_lap_fuel_load = self.getFuelLoad(float(strategy.fuelLoad[0]), self.numLaps)
 
-        if any([x != 0 for x in strategy['Weather']]): 
+        if any([x != 0 for x in strategy.weather]): 
             ### If weather is not completely Dry the constraint of changing tyre does not apply anymore
             if last_lap_fuel_load >= 0:
-                strategy['Valid'] = True
+                strategy.valid = True
                 return True
         
         else:
             if len(all_compounds) > 1 and last_lap_fuel_load >= 0:
-                strategy['Valid'] = True
+                strategy.valid = True
                 return True
         
-        strategy['Valid'] = False 
+        strategy.valid = False 
         return False
 
 
     # Selection step with dynamic penalty
     def selection_dynamic_penalty(self, step:int, population:list, threshold_quantile:float, best:int):
-        deltas = [abs(x['TotalTime'] - best) for x in population]
+        deltas = [abs(x.totalTime - best) for x in population]
         max_delta = max(1,max(deltas))
 
         alpha = np.exp(1+(1/self.iterations)*step)
@@ -372,135 +535,133 @@ class GeneticSolver:
         quantile = np.quantile(penalty, threshold_quantile)
 
         for p, pop in zip(penalty, population):
-            if not pop['Valid']:
-                if pop['NumPitStop'] < 1 and all([x == 'Dry' for x in pop['Weather']]):
+            if not pop.valid:
+                if pop.numPitStop < 1 and all([x == 'Dry' for x in pop.weather]):
                     p *= alpha
                     if p == 0.0:
                         p = np.exp(alpha)
-                last_lap_fuel_load = self.getFuelLoad(initial_fuel=pop['FuelLoad'][0], conditions=pop['Weather'])
+                last_lap_fuel_load = self.getFuelLoad(initial_fuel=float(pop.fuelLoad[0]), lap=self.numLaps)
                 if last_lap_fuel_load < 0:
                     last_lap_fuel_load = abs(last_lap_fuel_load)
                     p *= np.exp(last_lap_fuel_load)
                     if p == 0.0:
                         p = np.exp(last_lap_fuel_load)
                 
-        for idx, x in enumerate(population):
-            x['Penalty'] = penalty[idx]
-        sortedPopulation = sorted(population, key=lambda x: x['Penalty'])
-        selected = [x for _, x in enumerate(sortedPopulation) if x['Penalty'] < quantile]
-        
-        for x in selected:
-            x.pop('Penalty')
+        ### Strategies have no room for the penalty, so indexes are sorted by penalty (sort is stable as it was for the strategies)
+        order = sorted(range(len(population)), key=lambda idx: penalty[idx])
+        selected = [population[idx] for idx in order if penalty[idx] < quantile]
         
         return selected
     
 
     # Total crossover step
-    def crossover(self, p1:dict, p2:dict,):
-        ### Children are copies of parents by default
-        c1, c2 = copy.deepcopy(p1), copy.deepcopy(p2)
+    def crossover(self, p1:Strategy, p2:Strategy,):
+        ### Children are the parents by default, they share the arrays until an operator changes them
+        c1, c2 = p1.view(), p2.view()
 
         ### Check for recombination
-        if random.random() < self.mu:
+        if self.random.random() < self.mu:
             c1, c2 = self.crossover_fuel(c1, c2)
         
         return [c1,c2]
 
 
     # Crossover step on the fuel
-    def crossover_fuel(self, p1:dict, p2:dict):
-        fuelLoad_p1 = p1['FuelLoad'][0]
-        fuelLoad_p2 = p2['FuelLoad'][0]
-
-        p1['FuelLoad'][0] = fuelLoad_p2
-        p2['FuelLoad'][0] = fuelLoad_p1
-
-        
-        for lap in range(1, self.numLaps):
-            fuelLoad_p1 = self.getFuelLoad(initial_fuel=fuelLoad_p2, conditions=p1['Weather'][:lap+1])
-            fuelLoad_p2 = self.getFuelLoad(initial_fuel=fuelLoad_p1, conditions=p2['Weather'][:lap+1])
-            p1['FuelLoad'][lap] = fuelLoad_p2
-            p2['FuelLoad'][lap] = fuelLoad_p1
-        
-        return self.correct_strategy(p1), self.correct_strategy(p2)
-
+    def crossover_fuel(self, p1:Strategy, p2:Strategy):
+        fuelLoad_p1 = round(float(p1.fuelLoad[0]),2)
+        fuelLoad_p2 = round(float(p2.fuelLoad[0]),2)
+
+        ### Parents are already corrected and the fuel does not change the stints, only the lap times are recomputed
+        laps = np.arange(self.numLaps)
+        for child, fuel in ((p1, fuelLoad_p2), (p2, fuelLoad_p1)):
+            child.fuelLoad = self.getFuelLoads(fuel)
+            child.lapTime = self.getLapTimes(child.tyreCompound, child.tyreAge, laps, child.fuelLoad, child.pitStop)
+            child.totalTime = int(child.lapTime.sum())
+
+        return p1, p2
+
+
+    # Function to correct a strategy, only the stints from the one of lap start to the one of lap end-1 are re-evaluated
+    def correct_strategy(self, strategy:Strategy, start:int=0, end:int=None):
+        end = self.numLaps if end is None else end
+        strategy.detach('pitStop', 'tyreAge', 'tyreWear', 'lapTime')
+        compounds = strategy.tyreCompound
+        pitStops = strategy.pitStop
+
+        ### The dirty range begins with the stint of lap start
+        lap = start
+        while lap > 0 and not pitStops[lap] and compounds[lap] == compounds[lap-1]:
+            lap -= 1
+
+        while lap < self.numLaps:
+            ### A stint ends with a pit stop or with a change of compound, which then becomes a pit stop
+            compound = compounds[lap]
+            boundaries = np.flatnonzero(pitStops[lap+1:] | (compounds[lap+1:] != compound))
+            stintEnd = lap + 1 + boundaries[0] if len(boundaries) else self.numLaps
+
+            ### Tyres are changed every time they reach the maximum length of the stint
+            laps = np.arange(lap, stintEnd)
+            ages = (laps - lap) % self.maxStintLength[compound]
+            pits = ages == 0
+            if lap == 0:
+                pits[0] = pitStops[0]
+
+            ### TotalTime is updated by the difference of the stint time
+            oldStintTime = int(strategy.lapTime[lap:stintEnd].sum())
+            pitStops[lap:stintEnd] = pits
+            strategy.tyreAge[lap:stintEnd] = ages
+            strategy.tyreWear[lap:stintEnd] = self.tyreWearTable[compound, ages]
+            strategy.lapTime[lap:stintEnd] = self.getLapTimes(compound, ages, laps, strategy.fuelLoad[lap:stintEnd], pits)
+            strategy.totalTime = int(strategy.totalTime) + int(strategy.lapTime[lap:stintEnd].sum()) - oldStintTime
+            lap = stintEnd
+
+            ### Stints after the dirty range starting with a pit stop already made do not depend on the previous ones
+            if lap >= end and lap < self.numLaps and pitStops[lap]:
+                break
+
+        strategy.numPitStop = int(pitStops.sum())
 
-    # Function to correct a strategy
-    def correct_strategy(self, strategy:dict, index:int=0):
-        initialFuelLoad = round(strategy['FuelLoad'][0],2)
-        strategy['FuelLoad'][0] = initialFuelLoad
-        tyre = strategy['TyreCompound'][0]
-        strategy['LapTime'][0] = self.getLapTime(compound=tyre, compoundAge=0, lap=0, fuel_load=initialFuelLoad, conditions=strategy['Weather'][:1], drs=False, pitStop=strategy['PitStop'][0])
-        pitStopCounter = 0
-        
-        if index != 0 and index != self.numLaps:
-            compound = strategy['TyreCompound'][index-1]
-            tyre_age = strategy['TyreAge'][index-1]
-            while index < self.numLaps and strategy['PitStop'][index] == False:
-                tyre_age += 1
-                strategy['TyreAge'][index] = tyre_age
-                strategy['TyreCompound'][index] = compound
-                strategy['TyreWear'][index] = self.getTyreWear(strategy['TyreCompound'][index], strategy['TyreAge'][index])
-                strategy['LapTime'][index] = self.getLapTime(strategy['TyreCompound'][index], strategy['TyreAge'][index], index, strategy['FuelLoad'][index], strategy['Weather'][:index+1], False, False)
-                index += 1
-
-            strategy['NumPitStop'] = sum([x for x in strategy['PitStop'] if x])
-            strategy['TotalTime'] = sum(strategy['LapTime'])
-
-            return strategy
+        return strategy
 
-        for lap in range(1, self.numLaps):
-            weather = strategy['Weather'][:lap+1]
 
-            ### FuelLoad keeps the same, it just needs to be corrected if changed
-            fuelLoad = self.getFuelLoad(initial_fuel=initialFuelLoad, conditions=weather)
-            strategy['FuelLoad'][lap] = fuelLoad
+    # Function to build the offspring of a couple of parents, the random generator is seeded by the task so the offspring do not depend on where they are built
+    # It returns the children and the profile of the task: time of crossover and mutation and the model calls they made
+    def buildOffspring(self, p1:Strategy, p2:Strategy, seed:np.random.SeedSequence) -> tuple:
+        generator = self.random
+        self.random = np.random.default_rng(seed)
+        calls = (self.lapTimeCalls, self.fuelLoadCalls)
 
-            ### Get if a pitstop is made and compound lap'
-            pitStop = strategy['PitStop'][lap]
-            old_compound = strategy['TyreCompound'][lap-1]
-            compound = strategy['TyreCompound'][lap]
-            tyresAge = strategy['TyreAge'][lap-1]
-            
-            ### We have two options: either there is a pitstop or the compound has changes, if so we have to recalculate all
-            if pitStop or old_compound != compound or any([x >= 0.8 for x in strategy['TyreWear'][lap-1].values()]):
-                tyresAge = 0
-                pitStop = True
-                pitStopCounter += 1
-            else:
-                tyresAge += 1
-                
-            tyreWear = self.getTyreWear(compound=compound, lap=tyresAge)
-            timing = self.getLapTime(compound=compound, compoundAge=tyresAge, lap=lap, fuel_load=fuelLoad,conditions=weather, drs=False, pitStop=pitStop)
-            strategy['PitStop'][lap] = pitStop
-            strategy['TyreWear'][lap] = tyreWear
-            strategy['TyreAge'][lap] = tyresAge
-            strategy['LapTime'][lap] = timing
+        timer = time.perf_counter()
+        children = self.crossover(p1, p2)
+        crossoverTime = time.perf_counter() - timer
 
-        strategy['NumPitStop'] = pitStopCounter
-        strategy['TotalTime'] = sum(strategy['LapTime'])
+        timer = time.perf_counter()
+        children += self.mutation(p1) + self.mutation(p2)
+        mutationTime = time.perf_counter() - timer
 
-        return strategy
+        self.random = generator
+        return children, (crossoverTime, mutationTime, self.lapTimeCalls - calls[0], self.fuelLoadCalls - calls[1])
 
 
     # Total function for the mutation step
-    def mutation(self,child:dict) -> list:
-        childAllMutated = copy.deepcopy(child)
+    def mutation(self,child:Strategy) -> list:
+        ### Mutated children are built from views of the child, every mutation detaches the arrays it changes
+        childAllMutated = child.view()
         children = []
 
-        if random.random() < self.sigma:
-            children.append(self.mutation_compound(copy.deepcopy(child)))
+        if self.random.random() < self.sigma:
+            children.append(self.mutation_compound(child.view()))
             childAllMutated = self.mutation_compound(childAllMutated)
         
-        if random.random() < self.sigma:
-            children.append(self.mutation_pitstop(copy.deepcopy(child)))
-            children.append(self.mutation_pitstop_add(copy.deepcopy(child)))
+        if self.random.random() < self.sigma:
+            children.append(self.mutation_pitstop(child.view()))
+            children.append(self.mutation_pitstop_add(child.view()))
         
             childAllMutated = self.mutation_pitstop(childAllMutated)
             childAllMutated = self.mutation_pitstop_add(childAllMutated)
 
-        if random.random() < self.sigma:
-            children.append(self.mutation_fuel_load(copy.deepcopy(child)))
+        if self.random.random() < self.sigma:
+            children.append(self.mutation_fuel_load(child.view()))
             childAllMutated = self.mutation_fuel_load(childAllMutated)
         
         children.append(childAllMutated)
@@ -509,37 +670,33 @@ class GeneticSolver:
 
 
     # Mutation step on the compound
-    def mutation_compound(self, child:dict, ):
-        usedTyres = dict()
-        usedTyres[0] = child['TyreCompound'][0]
-        for lap in range(1, self.numLaps):
-             if child['TyreCompound'][lap] != child['TyreCompound'][lap - 1]:
-                usedTyres[lap] = child['TyreCompound'][lap]
+    def mutation_compound(self, child:Strategy, ):
+        ### Laps where a new compound is mounted
+        usedTyres = np.concatenate(([0], np.flatnonzero(child.tyreCompound[1:] != child.tyreCompound[:-1]) + 1))
 
-        lapRandom = random.randint(0, len(usedTyres)-1)
+        lapRandom = int(self.random.integers(len(usedTyres)))
         
-        lap = list(usedTyres.keys())[lapRandom]
-        oldCompound = usedTyres[lap]
+        lap = usedTyres[lapRandom]
+        oldCompound = child.tyreCompound[lap]
 
         compoundRandom = self.randomCompound()
 
         while oldCompound == compoundRandom:
             compoundRandom = self.randomCompound()
         
-        child['TyreCompound'][lap] = compoundRandom
+        child.detach('tyreCompound')
+        child.tyreCompound[lap] = compoundRandom
 
-        for i in range(lap + 1, self.numLaps):
-            if not child['PitStop'][lap]:
-                child['TyreCompound'][i] = compoundRandom
-            else:
-                return self.correct_strategy(child)
+        if not child.pitStop[lap]:
+            child.tyreCompound[lap+1:] = compoundRandom
+            return self.correct_strategy(child)
         
-        return self.correct_strategy(child)
+        return self.correct_strategy(child, lap, lap+1)
 
 
     # Mutation step on the pitstop
-    def mutation_pitstop(self,child:dict):
-        childPitNum = child['NumPitStop'] 
+    def mutation_pitstop(self,child:Strategy):
+        childPitNum = child.numPitStop 
 
         ### Check if we cannot make different pitStops number
         if childPitNum < 1:
@@ -549,301 +706,173 @@ class GeneticSolver:
         if childPitNum == 1: 
             return child
         
-        numRandomPitStop = random.randint(1,childPitNum)
-        numPitStops = 0
-        index = -1
-        for lap in range(0, self.numLaps):
-            if child['PitStop'][lap] == True:
-                numPitStops +=1
-                if numPitStops == numRandomPitStop:
-                    child['PitStop'][lap] = False
-                    child['NumPitStop'] -= 1
-                    index = lap
+        numRandomPitStop = int(self.random.integers(1, childPitNum+1))
+        pitStops = np.flatnonzero(child.pitStop)
+        if numRandomPitStop > len(pitStops):
+            return self.correct_strategy(child)
 
-        return self.correct_strategy(child, index)
+        ### The previous stint goes on until the next pit stop
+        index = pitStops[numRandomPitStop-1]
+        nextPitStop = pitStops[numRandomPitStop] if numRandomPitStop < len(pitStops) else self.numLaps
+        child.detach('pitStop', 'tyreCompound')
+        child.pitStop[index] = False
+        child.tyreCompound[index:nextPitStop] = child.tyreCompound[index-1]
+
+        return self.correct_strategy(child, index, index+1)
 
 
     # Mutation step for adding a pitstop
-    def mutation_pitstop_add(self, child:dict):
-        random_lap = random.randint(1, self.numLaps-1)
+    def mutation_pitstop_add(self, child:Strategy):
+        random_lap = int(self.random.integers(1, self.numLaps))
 
-        while child['PitStop'][random_lap] == True:
-            random_lap = random.randint(1, self.numLaps-1)
+        while child.pitStop[random_lap] == True:
+            random_lap = int(self.random.integers(1, self.numLaps))
         
         compound = self.randomCompound()
+
+        ### The new stint goes on until the next pit stop
+        nextPitStops = np.flatnonzero(child.pitStop[random_lap+1:])
+        nextPitStop = random_lap + 1 + nextPitStops[0] if len(nextPitStops) else self.numLaps
+        child.detach('pitStop', 'tyreCompound')
+        child.pitStop[random_lap] = True
+        child.tyreCompound[random_lap:nextPitStop] = compound
         
-        tyre_age = 0
-        child['PitStop'][random_lap] = True
-        child['TyreAge'][random_lap] = tyre_age
-        child['TyreWear'][random_lap] = self.getTyreWear(compound=compound, lap=tyre_age)
-        child['TyreCompound'][random_lap] = compound
-        child['LapTime'][random_lap] = self.getLapTime(compound=compound, compoundAge=tyre_age, lap=random_lap, fuel_load=child['FuelLoad'][random_lap], conditions=child['Weather'][:random_lap] if random_lap != 0 else child['Weather'][:random_lap], drs=False, pitStop=child['PitStop'][random_lap])
-        child['NumPitStop'] += 1
-        remaining = random_lap + 1
-        tyre_age += 1
-        while remaining < self.numLaps and child['PitStop'][remaining] == False:
-            child['TyreWear'][remaining] = self.getTyreWear(compound=compound, lap=tyre_age)
-            child['TyreCompound'][remaining] = compound
-            child['TyreAge'][remaining] = tyre_age
-            child['LapTime'][remaining] = self.getLapTime(compound=compound, compoundAge=tyre_age, lap=remaining, fuel_load=child['FuelLoad'][remaining], conditions=child['Weather'][:remaining+1], drs=False, pitStop=child['PitStop'][remaining])
-            remaining += 1
-            tyre_age += 1
-        child['TotalTime'] = sum(child['LapTime'])
-        
-        return child
+        return self.correct_strategy(child, random_lap, random_lap+1)
     
 
     # Mutation step on the fuel
-    def mutation_fuel_load(self, child:dict, ):
-        new_fuel = child['FuelLoad'][0]+random.uniform(-10,10)
+    def mutation_fuel_load(self, child:Strategy, ):
+        new_fuel = round(float(child.fuelLoad[0])+float(self.random.uniform(-10,10)),2)
 
-        child['FuelLoad'][0] = new_fuel
-        child['LapTime'][0] = self.getLapTime(compound=child['TyreCompound'][0], compoundAge=child['TyreAge'][0], lap=0, fuel_load=new_fuel, conditions=child['Weather'][:1], drs=False, pitStop=child['PitStop'][0])
-        
-        for lap in range(1,self.numLaps):
-            fuel = self.getFuelLoad(initial_fuel=new_fuel, conditions=child['Weather'][:lap+1])
-            timing = self.getLapTime(compound=child['TyreCompound'][lap], compoundAge=child['TyreAge'][lap], lap=lap, fuel_load=fuel, conditions=child['Weather'][:lap+1], drs=False, pitStop=child['PitStop'][lap])
-            
-            child['FuelLoad'][lap] = fuel
-            child['LapTime'][lap] = timing
+        ### Compounds and pit stops do not change, only the lap times are recomputed
+        child.fuelLoad = self.getFuelLoads(new_fuel)
+        child.lapTime = self.getLapTimes(child.tyreCompound, child.tyreAge, np.arange(self.numLaps), child.fuelLoad, child.pitStop)
+        child.totalTime = int(child.lapTime.sum())
 
-        child['TotalTime'] = sum(child['LapTime'])
         return child
 
 
     """
     Bruteforce algorithm
     """
-    # Function to build the tree of the bruteforce algorithm
-    def build_tree(self, temp_tree:list, tyres_age:int, lap:int):
-        global BEST_TIME
-        global STRATEGY
-
-        weather = self.weather.get_weather_percentage_list()
-        total_time = sum([x['LapTime'] for x in temp_tree])
-        pitStop_count = sum([x['PitStop'] for x in temp_tree])
-        initial_fuel = temp_tree[0]['FuelLoad']
-        compound_set = set([x['Compound'] for x in temp_tree])
-
-        if total_time > BEST_TIME or pitStop_count > 2:
-            return {'Strategy':None, 'TotalTime':np.inf}
-
-        if any([x >= 0.8 for x in temp_tree[-1]['TyreWear'].values()]):
-            return {'Strategy':None, 'TotalTime':np.inf}
-
-        if lap == self.numLaps:
-            if total_time < BEST_TIME:
-                if len(compound_set) > 1:
-                    BEST_TIME = total_time
-                    STRATEGY = copy.deepcopy(temp_tree)
-                    return {'Strategy':copy.deepcopy(temp_tree), 'TotalTime':total_time}
+    # Function to explore the subtree of a prefix (compounds and pit stops of the first laps) with an iterative branch and bound, the incumbent (best_time, best_decisions) is improved and returned
+    def branch_and_bound(self, prefix:tuple, best_time:int=np.inf, best_decisions:tuple=None, max_pit_stops:int=2, incumbent:Value=None):
+        """
+        Nodes are (lap, compound, tyre age, pit stops, more than one compound used, time up to the lap) kept on an explicit stack in the order of the
+        recursive version. The current path and the incumbent are decision vectors (compound and pit stop of every lap). A node is pruned when its
+        time plus the best possible time of every remaining lap cannot beat the incumbent.
+        Subtrees explored in parallel share the best time in incumbent, a tie with it is still explored so the optimum found first in the order
+        of the tree is the same of the serial search.
+        """
+        lapTimes, usable, remaining, allowed = self.bruteforce_tables()
+
+        path_compound = list(prefix[0]) + [0] * (self.numLaps - len(prefix[0]))
+        path_pitStop = list(prefix[1]) + [False] * (self.numLaps - len(prefix[1]))
+
+        ### The root is the last lap of the prefix
+        age, pits, total = 0, 0, 0
+        for lap, (compound, pitStop) in enumerate(zip(*prefix)):
+            age = 0 if pitStop or lap == 0 else age + 1
+            pits += pitStop
+            total += lapTimes[compound][age][lap][int(pitStop)]
+
+        stack = [(len(prefix[0])-1, prefix[0][-1], age, pits, len(set(prefix[0])) > 1, total)]
+        shared = incumbent.value if incumbent is not None else np.inf
+        nodes = 0
+        while stack:
+            lap, compound, age, pits, more, total = stack.pop()
+            if total + remaining[lap+1] >= best_time or total + remaining[lap+1] > shared:
+                continue
+
+            ### The shared best time is read once in a while, it is just a stronger bound
+            nodes += 1
+            if incumbent is not None and nodes % 1024 == 0:
+                shared = incumbent.value
+
+            path_compound[lap] = compound
+            path_pitStop[lap] = lap > 0 and age == 0
+
+            if lap == self.numLaps-1:
+                ### A single compound is not allowed
+                if more:
+                    best_time = int(total)
+                    best_decisions = (list(path_compound), list(path_pitStop))
+                    if incumbent is not None:
+                        with incumbent.get_lock():
+                            incumbent.value = min(incumbent.value, best_time)
+                            shared = incumbent.value
+                continue
             
-            return {'Strategy':None, 'TotalTime':np.inf}
-         
-        fuel_load = self.getFuelLoad(initial_fuel,weather[:lap+1])
-        w = weather[lap]
+            stack.extend(reversed(self.bruteforce_children(lap, compound, age, pits, more, total, max_pit_stops)))
 
-        if w < 20:
-            idx = 1
-            values = {1:None, 2:None, 3:None, 4:None}
-            for compound in ['Soft', 'Medium','Hard']:
-                if compound == temp_tree[-1]['Compound']:
-                    for pitStop in [True,False]:
-                        node = {'Compound':compound, 'TyreWear': self.getTyreWear(compound, tyres_age+1 if not pitStop else 0), 'TyreAge':tyres_age+1 if not pitStop else 0, 'FuelLoad':fuel_load, 'PitStop':pitStop, 'LapTime': self.getLapTime(compound=compound, compoundAge=tyres_age+1 if not pitStop else 0, lap=lap, fuel_load=fuel_load, conditions=weather[:lap+1], drs=False, pitStop=pitStop)}
-                        temp_tree.append(node)
-                        values[idx] = self.build_tree(temp_tree, tyres_age+1 if not pitStop else 0, lap+1)
-                        temp_tree.pop()
-                        idx+=1
-                else:
-                    pitStop = True
-                    node = {'Compound':compound, 'TyreWear': self.getTyreWear(compound, tyres_age+1 if not pitStop else 0), 'TyreAge':tyres_age+1 if not pitStop else 0, 'FuelLoad':fuel_load, 'PitStop':pitStop, 'LapTime': self.getLapTime(compound=compound, compoundAge=tyres_age+1 if not pitStop else 0, lap=lap, fuel_load=fuel_load, conditions=weather[:lap+1], drs=False, pitStop=pitStop)}
-                    temp_tree.append(node)
-                    values[idx] = self.build_tree(temp_tree, tyres_age+1 if not pitStop else 0, lap+1)
-                    temp_tree.pop()
-                    idx+=1
-        elif w > 50 and w < 80:
-            values = {1:None}
-            idx = 1
-            compound = 'Inter'
-            if compound == temp_tree[-1]['Compound']:
-                for pitStop in [True,False]:
-                    node = {'Compound':compound, 'TyreWear': self.getTyreWear(compound, tyres_age+1 if not pitStop else 0), 'TyreAge':tyres_age+1 if not pitStop else 0, 'FuelLoad':fuel_load, 'PitStop':pitStop, 'LapTime': self.getLapTime(compound=compound, compoundAge=tyres_age+1 if not pitStop else 0, lap=lap, fuel_load=fuel_load, conditions=weather[:lap+1], drs=False, pitStop=pitStop)}
-                    temp_tree.append(node)
-                    values[idx] = self.build_tree(temp_tree, tyres_age+1 if not pitStop else 0, lap+1)
-                    temp_tree.pop()
-            else:
-                pitStop = True
-                node = {'Compound':compound, 'TyreWear': self.getTyreWear(compound, tyres_age+1 if not pitStop else 0), 'TyreAge':tyres_age+1 if not pitStop else 0, 'FuelLoad':fuel_load, 'PitStop':pitStop, 'LapTime': self.getLapTime(compound=compound, compoundAge=tyres_age+1 if not pitStop else 0, lap=lap, fuel_load=fuel_load, conditions=weather[:lap+1], drs=False, pitStop=pitStop)}
-                temp_tree.append(node)
-                values[idx] = self.build_tree(temp_tree, tyres_age+1 if not pitStop else 0, lap+1)
-                temp_tree.pop()
-        elif w > 80:
-            values = {1:None}
-            idx = 1
-            compound = 'Wet'
-            if compound == temp_tree[-1]['Compound']:
-                for pitStop in [True,False]:
-                    node = {'Compound':compound, 'TyreWear': self.getTyreWear(compound, tyres_age+1 if not pitStop else 0), 'TyreAge':tyres_age+1 if not pitStop else 0, 'FuelLoad':fuel_load, 'PitStop':pitStop, 'LapTime': self.getLapTime(compound=compound, compoundAge=tyres_age+1 if not pitStop else 0, lap=lap, fuel_load=fuel_load, conditions=weather[:lap+1], drs=False, pitStop=pitStop)}
-                    temp_tree.append(node)
-                    values[idx] = self.build_tree(temp_tree, tyres_age+1 if not pitStop else 0, lap+1)
-                    temp_tree.pop()
-            else:
-                pitStop = True
-                node = {'Compound':compound, 'TyreWear': self.getTyreWear(compound, tyres_age+1 if not pitStop else 0), 'TyreAge':tyres_age+1 if not pitStop else 0, 'FuelLoad':fuel_load, 'PitStop':pitStop, 'LapTime': self.getLapTime(compound=compound, compoundAge=tyres_age+1 if not pitStop else 0, lap=lap, fuel_load=fuel_load, conditions=weather[:lap+1], drs=False, pitStop=pitStop)}
-                temp_tree.append(node)
-                values[idx] = self.build_tree(temp_tree, tyres_age+1 if not pitStop else 0, lap+1)
-                temp_tree.pop()
-        else:
-            values = {1:None, 2:None, 3:None, 4:None}
-            idx = 1
-            for compound in ['Inter','Soft', 'Medium','Hard']:
-                if compound == temp_tree[-1]['Compound']:
-                    for pitStop in [True,False]:
-                        node = {'Compound':compound, 'TyreWear': self.getTyreWear(compound, tyres_age+1 if not pitStop else 0), 'TyreAge':tyres_age+1 if not pitStop else 0, 'FuelLoad':fuel_load, 'PitStop':pitStop, 'LapTime': self.getLapTime(compound=compound, compoundAge=tyres_age+1 if not pitStop else 0, lap=lap, fuel_load=fuel_load, conditions=weather[:lap+1], drs=False, pitStop=pitStop)}
-                        temp_tree.append(node)
-                        values[idx] = self.build_tree(temp_tree, tyres_age+1 if not pitStop else 0, lap+1)
-                        temp_tree.pop()
-                        idx+=1
-                else:
-                    pitStop = True
-                    node = {'Compound':compound, 'TyreWear': self.getTyreWear(compound, tyres_age+1 if not pitStop else 0), 'TyreAge':tyres_age+1 if not pitStop else 0, 'FuelLoad':fuel_load, 'PitStop':pitStop, 'LapTime': self.getLapTime(compound=compound, compoundAge=tyres_age+1 if not pitStop else 0, lap=lap, fuel_load=fuel_load, conditions=weather[:lap+1], drs=False, pitStop=pitStop)}
-                    temp_tree.append(node)
-                    values[idx] = self.build_tree(temp_tree, tyres_age+1 if not pitStop else 0, lap+1)
-                    temp_tree.pop()
-                    idx+=1
-
-        ### Best Strategy
-        to_remove = list()
-        for key, val in values.items():
-            if val is None:
-                to_remove.append(key)
-        for key in to_remove:
-            values.pop(key)
-        for val in values.values():
-            if val['Strategy'] is not None:
-                if len(val['Strategy']) < self.numLaps:
-                    val['TotalTime'] = np.inf
-        best_strategy = min(values, key=lambda x: values[x]['TotalTime'])
-
-
-        return {'Strategy':copy.deepcopy(values[best_strategy]['Strategy']), 'TotalTime':values[best_strategy]['TotalTime']}
-
-
-    # Function to get the result of the bruteforce algorithm
-    def lower_bound(self,):
-        ### Build the solution space as a tree
-        temp_tree = []
-        weather = self.weather.get_weather_percentage_list()
-        initial_fuel = self.getInitialFuelLoad(weather)
+        return best_time, best_decisions
+
+
+    # Function to get the children of a node of the bruteforce tree in the order of the search
+    def bruteforce_children(self, lap:int, compound:int, age:int, pits:int, more:bool, total:float, max_pit_stops:int):
+        lapTimes, usable, _, allowed = self.bruteforce_tables()
+
+        ### Same compound: new tyres or one lap older ones, other compounds: pit stop
+        lap += 1
+        children = []
+        for c in allowed[lap]:
+            if c == compound:
+                if pits < max_pit_stops:
+                    children.append((lap, c, 0, pits+1, more, total + lapTimes[c][0][lap][1]))
+                if age+1 < usable[c]:
+                    children.append((lap, c, age+1, pits, more, total + lapTimes[c][age+1][lap][0]))
+            elif pits < max_pit_stops:
+                children.append((lap, c, 0, pits+1, True, total + lapTimes[c][0][lap][1]))
+        
+        return children
+
+
+    # Function to get the prefixes (compounds and pit stops of the first depth laps) splitting the bruteforce tree, in the order of the search
+    def bruteforce_prefixes(self, depth:int, max_pit_stops:int=2):
+        lapTimes, _, _, allowed = self.bruteforce_tables()
+
+        prefixes = [(([compound], [False]), (0, compound, 0, 0, False, lapTimes[compound][0][0][0])) for compound in allowed[0]]
+        for _ in range(1, min(depth, self.numLaps-1)):
+            new_prefixes = []
+            for (compounds, pitStops), node in prefixes:
+                for child in self.bruteforce_children(*node, max_pit_stops):
+                    new_prefixes.append(((compounds + [child[1]], pitStops + [child[2] == 0]), child))
+            prefixes = new_prefixes
+
+        return [prefix for prefix, _ in prefixes]
+
+
+    # Function to get the result of the bruteforce algorithm, with more workers the tree is split at split_depth and the subtrees are explored in parallel
+    def lower_bound(self, max_pit_stops:int=2, split_depth:int=8):
         timer_start = time.time()
-        w = weather[0]
+        best_time, best_decisions = np.inf, None
+        self.bruteforce_tables()
 
-        if w < 20:
-            values = {1:None, 2:None, 3:None}
+        if self.workers > 1:
+            prefixes = self.bruteforce_prefixes(split_depth, max_pit_stops)
+            print(f"[BruteForce] Computations of {len(prefixes)} subtrees on {self.workers} workers...")
+
+            incumbent = Value('d', np.inf)
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=initWorker, initargs=(self, incumbent)) as pool:
+                results = list(pool.map(bruteforceWorker, prefixes, [max_pit_stops] * len(prefixes)))
             
-            ### Soft
-            soft_timer = time.time()
-            compound = 'Soft'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[1] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            soft_timer = ms_to_time(round(1000*(time.time() - soft_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {soft_timer}")
-
-            ### Medium
-            medium_timer = time.time()
-            compound = 'Medium'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[2] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            medium_timer = ms_to_time(round(1000*(time.time() - medium_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {medium_timer}")
-
-            ### Hard
-            hard_timer = time.time()
-            compound = 'Hard'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[3] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            hard_timer = ms_to_time(round(1000*(time.time() - hard_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {hard_timer}")
-        elif w > 50 and w < 80:
-            values = {1:None}
-            ### Inter
-            inter_timer = time.time()
-            compound = 'Inter'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[1] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            inter_timer = ms_to_time(round(1000*(time.time() - inter_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {inter_timer}")
-        elif w > 80:
-            values = {1:None}
-
-            ### Wet
-            wet_timer = time.time()
-            compound = 'Wet'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[1] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            wet_timer = ms_to_time(round(1000*(time.time() - wet_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {wet_timer}")
+            ### min keeps the first of the best subtrees, as the serial search does
+            best_time, best_decisions = min(results, key=lambda x: x[0])
         else:
-            values = {1:None, 2:None, 3:None, 4:None}
-            
-            ### Inter
-            inter_timer = time.time()
-            compound = 'Inter'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[1] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            inter_timer = ms_to_time(round(1000*(time.time() - inter_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {inter_timer}")
-
-            ### Soft
-            soft_timer = time.time()
-            compound = 'Soft'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[2] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            soft_timer = ms_to_time(round(1000*(time.time() - soft_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {soft_timer}")
-
-            ### Medium
-            medium_timer = time.time()
-            compound = 'Medium'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[3] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            medium_timer = ms_to_time(round(1000*(time.time() - medium_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {medium_timer}")
-
-            ### Hard
-            hard_timer = time.time()
-            compound = 'Hard'
-            print(f"[BruteForce] Computations starting with {compound}...")
-            temp_tree.append({'Compound':compound, 'TyreWear': self.getTyreWear(compound, 0), 'TyreAge':0, 'FuelLoad':initial_fuel, 'PitStop':False, 'LapTime': self.getLapTime(compound=compound, compoundAge=0, lap=0, fuel_load=initial_fuel, conditions=[weather[0]], drs=False, pitStop=False)})
-            values[4] = self.build_tree(temp_tree, 0, 1)
-            temp_tree.pop()
-            hard_timer = ms_to_time(round(1000*(time.time() - hard_timer)))
-            print(f"\033[A\033[K[BruteForce] {compound} computed in {hard_timer}")
-
-        ### Best Strategy
-        best_strategy_index = min(values, key=lambda x: values[x]['TotalTime'])
-        best_strategy, best_laptime = values[best_strategy_index]['Strategy'], values[best_strategy_index]['TotalTime']
-
-        if best_strategy is None:
+            ### Every first compound is a subtree, the incumbent is carried from one to the next
+            for compound in self.allowed_compounds(self.weather.get_weather_percentage_list()[0]):
+                compound_timer = time.time()
+                print(f"[BruteForce] Computations starting with {COMPOUNDS[compound]}...")
+                best_time, best_decisions = self.branch_and_bound(([compound], [False]), best_time, best_decisions, max_pit_stops)
+                compound_timer = ms_to_time(round(1000*(time.time() - compound_timer)))
+                print(f"\033[A\033[K[BruteForce] {COMPOUNDS[compound]} computed in {compound_timer}")
+
+        if best_decisions is None:
             print(f"Strategy is none...")
             exit(-1)
 
+        best_strategy, best_laptime = self.bruteforce_strategy(*best_decisions), best_time
+
         for lap, strategy in enumerate(best_strategy):
             print(f"Lap {lap+1} -> Compound '{strategy['Compound']}', TyresAge {strategy['TyreAge']}, Wear '{round(strategy['TyreWear']['FL']*100,1)}'% | '{round(strategy['TyreWear']['FR']*100,1)}'% | '{round(strategy['TyreWear']['RL']*100,1)}'% | '{round(strategy['TyreWear']['RR']*100,1)}'%, Fuel '{round(strategy['FuelLoad'],2)}' Kg, PitStop '{'Yes' if strategy['PitStop'] else 'No'}', Time '{ms_to_time(strategy['LapTime'])}' ms")
         print(f"Computed in time {ms_to_time(round(1000*(time.time()-timer_start)))}")
@@ -853,7 +882,163 @@ class GeneticSolver:
         return best_strategy, best_laptime
     
 
-    # Function to get the initial fuel load 
-    def getInitialFuelLoad(self, conditions:list):
-        weather = [self.weather.get_weather_string(c) for c in conditions[:-1]]
-        return round(self.car.predict_starting_fuel(weather), 2)
\ No newline at end of file
+    # Function to get the tables of the bruteforce: lap times as nested lists, usable tyre ages of every compound, best possible time from every lap to the end and compounds allowed at every lap
+    def bruteforce_tables(self,):
+        if self.bruteforceTables is None:
+            lapTimes = self.bruteforce_lap_times()
+            usable = np.isfinite(lapTimes[:, :, :, 0]).any(axis=2).sum(axis=1).tolist()
+            remaining = np.concatenate((np.cumsum(lapTimes.min(axis=(0, 1, 3))[::-1])[::-1], [0])).tolist()
+            allowed = [self.allowed_compounds(w) for w in self.weather.get_weather_percentage_list()[:self.numLaps]]
+            self.bruteforceTables = (lapTimes.tolist(), usable, remaining, allowed)
+
+        return self.bruteforceTables
+
+
+    # Function to get the fuel load of every lap used by the bruteforce, the initial one is the fuel burnt in the whole race
+    def bruteforce_fuel_loads(self,):
+        initial_fuel = self.getInitialFuelLoad()
+
+        return [initial_fuel] + [self.getFuelLoad(initial_fuel, lap) for lap in range(1, self.numLaps)]
+
+
+    # Function to get the lap times of the bruteforce indexed by [compound, tyre age, lap, pit stop], worn tyres and compounds not allowed by the weather cost inf
+    def bruteforce_lap_times(self,):
+        fuel = np.array(self.bruteforce_fuel_loads())
+        lapTimes = np.round(self.lapTimeTable + np.round(self.car.fuel_lose * (fuel - self.fuelConsumption[:self.numLaps]))[None, None, :, None])
+        lapTimes[np.logical_or.accumulate((self.tyreWearTable >= 0.8).any(axis=2), axis=1)] = np.inf
+
+        weather = self.weather.get_weather_percentage_list()
+        for lap in range(self.numLaps):
+            lapTimes[[c for c in range(len(COMPOUNDS)) if c not in self.allowed_compounds(weather[lap])], :, lap] = np.inf
+
+        return lapTimes
+
+
+    # Function to build the strategy (list of laps) of the bruteforce from its decision vectors
+    def bruteforce_strategy(self, compounds:list, pitStops:list):
+        fuel = self.bruteforce_fuel_loads()
+        strategy = []
+        age = 0
+        for lap, (compound, pitStop) in enumerate(zip(compounds, pitStops)):
+            age = 0 if pitStop or lap == 0 else age + 1
+            strategy.append({'Compound':COMPOUNDS[compound], 'TyreWear': self.getTyreWear(compound, age), 'TyreAge':age, 'FuelLoad':fuel[lap], 'PitStop':bool(pitStop), 'LapTime': self.getLapTime(compound=compound, compoundAge=age, lap=lap, fuel_load=fuel[lap], pitStop=pitStop)})
+        
+        return strategy
+
+
+    # Function to get the compounds (codes) the bruteforce can mount with the given rain percentage
+    def allowed_compounds(self, w:int):
+        if w < 20:
+            return [COMPOUNDS.index(c) for c in ['Soft', 'Medium', 'Hard']]
+        elif w > 50 and w < 80:
+            return [COMPOUNDS.index('Inter')]
+        elif w > 80:
+            return [COMPOUNDS.index('Wet')]
+        
+        return [COMPOUNDS.index(c) for c in ['Inter', 'Soft', 'Medium', 'Hard']]
+
+
+    # Function to get the exact lower bound with dynamic programming over (lap, compound, tyre age, pit stops made, more than one compound used)
+    def lower_bound_dp(self, max_pit_stops:int=2):
+        """
+        Same search space and strategy format of lower_bound: fixed initial fuel, compounds allowed by the weather, tyres never worn over 80%,
+        at most max_pit_stops pit stops and more than one compound used. Only whether a second compound has been used matters for the last
+        constraint, so a flag replaces the set of compounds.
+        """
+        timer_start = time.time()
+        lapTimes = self.bruteforce_lap_times()
+        numCompounds, numPits = len(COMPOUNDS), max_pit_stops + 1
+
+        ### values[compound, tyre age, pit stops, more compounds] is the best time up to the current lap, parents[lap] keeps where the pit stops of the lap come from
+        values = np.full((numCompounds, self.numLaps, numPits, 2), np.inf)
+        values[:, 0, 0, 0] = lapTimes[:, 0, 0, 0]
+        parents = np.zeros((self.numLaps, numCompounds, numPits, 2, 3), dtype=int)
+
+        for lap in range(1, self.numLaps):
+            new_values = np.full_like(values, np.inf)
+
+            ### Same tyres, one lap older
+            new_values[:, 1:] = values[:, :-1] + lapTimes[:, 1:, lap, 0][:, :, None, None]
+
+            ### Pit stop: only the best tyre age of every state matters
+            ages = values.argmin(axis=1)
+            best = np.take_along_axis(values, ages[:, None], axis=1)[:, 0]
+            for compound in range(numCompounds):
+                for pits in range(1, numPits):
+                    for more in range(2):
+                        candidates = [(best[compound, pits-1, more], compound, more)]
+                        if more:
+                            candidates += [(best[c, pits-1, m], c, m) for c in range(numCompounds) if c != compound for m in range(2)]
+                        
+                        time_before, c, m = min(candidates, key=lambda x: x[0])
+                        new_values[compound, 0, pits, more] = time_before + lapTimes[compound, 0, lap, 1]
+                        parents[lap, compound, pits, more] = [c, ages[c, pits-1, m], m]
+
+            values = new_values
+
+        ### A single compound is not allowed
+        best_laptime = values[:, :, :, 1].min()
+        if math.isinf(best_laptime):
+            return None, np.inf
+
+        compound, age, pits = np.unravel_index(values[:, :, :, 1].argmin(), values[:, :, :, 1].shape)
+        more = 1
+        compounds, pitStops = [0] * self.numLaps, [False] * self.numLaps
+        for lap in range(self.numLaps-1, -1, -1):
+            compounds[lap], pitStops[lap] = int(compound), bool(age == 0 and lap > 0)
+
+            if pitStops[lap]:
+                compound, age, more = parents[lap, compound, pits, more]
+                pits -= 1
+            else:
+                age -= 1
+        best_strategy = self.bruteforce_strategy(compounds, pitStops)
+
+        print(f"[DynamicProgramming] Computed in time {ms_to_time(round(1000*(time.time()-timer_start)))}")
+        print(f"[DynamicProgramming] Total time {ms_to_time(int(best_laptime))}")
+
+        return best_strategy, int(best_laptime)
+
+
+    # Function to get the key of the lower bound: a hash of everything the solvers depend on (car model through its lookup tables, weather, pit stop time, laps and pit stop limit)
+    def lower_bound_key(self, max_pit_stops:int=2):
+        digest = hashlib.sha256()
+        for table in [self.lapTimeTable, self.tyreWearTable, self.fuelConsumption]:
+            digest.update(np.ascontiguousarray(table, dtype=np.float64).tobytes())
+        
+        digest.update(json.dumps({'FuelLose': self.car.fuel_lose, 'Weather': self.weather.get_weather_percentage_list(), 'PitStopTime': self.pitStopTime, 'Laps': self.numLaps, 'MaxPitStops': max_pit_stops}).encode())
+
+        return digest.hexdigest()
+
+
+    # Function to get the lower bound from the cache in LowerBound.json of the circuit folder, it is computed (and stored) only if the key is not there
+    def cached_lower_bound(self, path:str, max_pit_stops:int=2, bruteforce:bool=False, split_depth:int=8):
+        cache_path = os.path.join(path, 'LowerBound.json')
+        key = self.lower_bound_key(max_pit_stops)
+
+        cache = dict()
+        if os.path.isfile(cache_path):
+            with open(cache_path, 'r') as f:
+                cache = json.load(f)
+
+        if key in cache:
+            print(f"[LowerBound] Found in cache {cache_path}")
+            return cache[key]['Strategy'], cache[key]['TotalTime']
+
+        ### Both solvers are exact, so the key does not depend on which one computed the bound
+        if bruteforce:
+            strategy, timing = self.lower_bound(max_pit_stops=max_pit_stops, split_depth=split_depth)
+        else:
+            strategy, timing = self.lower_bound_dp(max_pit_stops=max_pit_stops)
+
+        if strategy is not None:
+            cache[key] = {'Weather': self.weather.filename, 'MaxPitStops': max_pit_stops, 'TotalTime': timing, 'Strategy': strategy}
+            with open(cache_path, 'w') as f:
+                json.dump(cache, f, indent=4)
+
+        return strategy, timing
+
+
+    # Function to get the initial fuel load, that is the fuel burnt in the whole race
+    def getInitialFuelLoad(self,):
+        return round(self.fuelConsumption[self.numLaps], 2)
\ No newline at end of file
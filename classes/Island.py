@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import traceback
+import numpy as np
+import pandas as pd
+import multiprocessing as mp
+
+from classes.Car import Car
+from classes.Genetic import GeneticSolver
+from classes.Profiler import Profiler
+from classes.Utils import ms_to_time
+
+# Function run by every island process: it builds its own solver and runs it, sending the best individuals to the coordinator every interval generations
+def islandWorker(conn, settings:dict, bf_time:int, interval:int, migrants:int, save_stats:bool=False):
+    ### Islands run in parallel, their output would be mixed up so only the log files are written
+    sys.stdout = open(os.devnull, 'w')
+    sys.stderr = sys.stdout
+
+    try:
+        solver = GeneticSolver(**settings)
+
+        def migrate(gen:int, population:list):
+            if (gen+1) % interval != 0 or gen+1 >= solver.iterations:
+                return population
+
+            ranked = sorted(population, key=lambda x: (not x.valid, x.totalTime))
+            conn.send(('Migrants', ranked[:migrants]))
+            immigrants = conn.recv()
+
+            ### Immigrants replace the worst individuals
+            return ranked[:len(ranked)-len(immigrants)] + immigrants
+
+        ### The profiler is not part of the result of run, it is sent with it
+        conn.send(('Result', solver.run(bf_time=bf_time, migrate=migrate, save_stats=save_stats) + (solver.profiler,)))
+    except Exception:
+        conn.send(('Error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class IslandSolver:
+    """
+    Island model of the genetic algorithm: every island is a GeneticSolver running in its own process with its own mutation and crossover probabilities.
+    Every interval generations each island sends its best individuals to the next one (ring topology).
+    """
+    def __init__(self, islands:int=4, population:int=2, mutation_pr=0.75, crossover_pr=0.5, iterations:int=1, car:Car=None, circuit:str='', weather:str='', save_path:str='', cache_size:int=100000, workers:int=1, interval:int=10, migrants:int=2, seed:int=None, log_policy:str='overwrite') -> None:
+        self.islands = islands
+        self.iterations = iterations
+        self.interval = interval
+        self.migrants = migrants
+        self.path = save_path
+
+        ### Probabilities can be given for every island, a single value is spread between its half and itself
+        mutation_pr = mutation_pr if isinstance(mutation_pr, list) else np.linspace(mutation_pr, mutation_pr/2, islands).round(2).tolist()
+        crossover_pr = crossover_pr if isinstance(crossover_pr, list) else np.linspace(crossover_pr, crossover_pr/2, islands).round(2).tolist()
+
+        ### Every island gets its own child stream of the seed, so the whole run is reproducible
+        seeds = np.random.SeedSequence(seed).spawn(islands)
+        self.settings = []
+        for island in range(islands):
+            self.settings.append({'population':population, 'mutation_pr':mutation_pr[island], 'crossover_pr':crossover_pr[island], 'iterations':iterations, 'car':car, 'circuit':circuit, 'weather':weather, 'save_path':os.path.join(save_path, f'Island_{island}'), 'cache_size':cache_size, 'workers':workers, 'seed':seeds[island], 'log_policy':log_policy})
+
+
+    # Function to run the islands, it returns the same values of GeneticSolver.run and self.profiler sums the ones of the islands
+    def run(self, bf_time:int=0, save_stats:bool=False):
+        start_timer = time.time()
+
+        conns = []
+        processes = []
+        for settings in self.settings:
+            conn, child_conn = mp.Pipe()
+            process = mp.Process(target=islandWorker, args=(child_conn, settings, bf_time, self.interval, self.migrants, save_stats))
+            process.start()
+            child_conn.close()
+            conns.append(conn)
+            processes.append(process)
+
+        print(f"\n-------------------------------------------------------------\nIslands = {self.islands}\nMigration every {self.interval} generations ({self.migrants} individuals)\n" + "\n".join([f"Island {idx}: Mutation = {s['mutation_pr']}, Crossover = {s['crossover_pr']}" for idx, s in enumerate(self.settings)]) + "\n-------------------------------------------------------------\n")
+
+        results = [None] * self.islands
+        generation = 0
+        try:
+            while any([result is None for result in results]):
+                ### Islands stop at the same generations, so every round collects one message from each running island
+                migrants = dict()
+                for idx, conn in enumerate(conns):
+                    if results[idx] is not None:
+                        continue
+
+                    kind, payload = conn.recv()
+                    if kind == 'Error':
+                        raise RuntimeError(f"Island {idx} failed:\n{payload}")
+                    elif kind == 'Result':
+                        results[idx] = payload
+                    else:
+                        migrants[idx] = payload
+
+                if len(migrants) == 0:
+                    continue
+
+                ### Every island receives the best individuals of the previous one
+                generation += self.interval
+                running = sorted(migrants.keys())
+                for pos, idx in enumerate(running):
+                    conns[idx].send(migrants[running[pos-1]])
+
+                bests = [min([x.totalTime for x in migrants[idx] if x.valid], default=np.inf) for idx in running]
+                print(f"[Islands] Generation {generation}/{self.iterations} - best of every island: {', '.join([ms_to_time(x) for x in bests])}")
+        except BaseException:
+            ### Islands still running would wait for their immigrants forever
+            for process in processes:
+                process.terminate()
+            raise
+        finally:
+            for process in processes:
+                process.join()
+
+        end_timer = time.time() - start_timer
+
+        ### The best island gives the strategy, statistics of the generations are put together with their island and the fitness only keeps the improvements of the overall best
+        best_island = min(range(self.islands), key=lambda idx: results[idx][1])
+        best, best_eval = results[best_island][0], results[best_island][1]
+        boxplot_df = pd.concat([result[2].assign(Island=idx) for idx, result in enumerate(results)])
+        os.makedirs(self.path, exist_ok=True)
+        boxplot_df.to_csv(os.path.join(self.path, 'Boxplot.csv'))
+
+        fitness_values = dict()
+        current = np.inf
+        for gen, fitness in sorted([(gen, fitness) for result in results for gen, fitness in zip(result[3]['Generation'], result[3]['Fitness'])]):
+            if fitness < current:
+                current = fitness
+                fitness_values[gen] = fitness
+        fit_dict = {'Generation' : list(fitness_values.keys()), 'Fitness' : list(fitness_values.values())}
+
+        profiler = Profiler.merge([result[-1] for result in results])
+        profiler.elapsed = end_timer
+        if save_stats:
+            profiler.save(os.path.join(self.path, 'Stats.json'))
+
+        print(f"[Islands] Best strategy found by island {best_island}: {ms_to_time(best_eval)} in {ms_to_time(round(end_timer*1000))}")
+
+        self.profiler = profiler
+
+        return best, best_eval, boxplot_df, fit_dict, end_timer
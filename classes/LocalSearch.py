@@ -3,15 +3,14 @@ import math, time, copy, os
 from threading import local
 import numpy as np
 import pandas as pd
-from random import SystemRandom
 from tqdm import tqdm
 
 from classes.Car import Car
 from classes.Weather import Weather
 from classes.Genetic import GeneticSolver
-random = SystemRandom()
+from classes.Strategy import Strategy
 
-from classes.Utils import CIRCUIT, Log, ms_to_time
+from classes.Utils import CIRCUIT, COMPOUNDS, Log, ms_to_time
 
 TYRE_WEAR_THRESHOLD = 0.3
 BEST_TIME = np.inf
@@ -25,18 +24,18 @@ We keep the file in the code for completeness.
 
 class LocalSearch:
     def __init__(self, strategy:dict, genetic:GeneticSolver):
-        self.strategy = strategy
+        self.strategy = Strategy.from_dict(strategy)
         self.genetic = genetic
 
     def find_interval(self, indexPitstop: int):
         count = 0
         index = 0
 
-        if indexPitstop == self.strategy['NumPitStop'] + 1 :
+        if indexPitstop == self.strategy.numPitStop + 1 :
             return -1
         
         for i in range(0, self.genetic.numLaps):
-            if self.strategy['PitStop'][i] == True:
+            if self.strategy.pitStop[i] == True:
                 count = count + 1
 
             if count == indexPitstop:
@@ -48,16 +47,16 @@ class LocalSearch:
         """
         Shake is working on the compounds, so it changes randomly only one compound
         """
-        shakeStrategy = copy.deepcopy(self.strategy)
+        shakeStrategy = self.strategy.copy()
         
-        if randomCompound == self.strategy['TyreCompound'][indexRandom]:
+        if randomCompound == self.strategy.tyreCompound[indexRandom]:
             return shakeStrategy
 
-        shakeStrategy['TyreCompound'][indexRandom] = randomCompound
+        shakeStrategy.tyreCompound[indexRandom] = randomCompound
         if indexRandom!=self.genetic.numLaps-1:
             for i in range(indexRandom + 1, self.genetic.numLaps):
-                if shakeStrategy['PitStop'][i] == False:
-                    shakeStrategy['TyreCompound'][i] = randomCompound
+                if shakeStrategy.pitStop[i] == False:
+                    shakeStrategy.tyreCompound[i] = randomCompound
                 else:
                     if self.genetic.checkValidity(self.genetic.correct_strategy(shakeStrategy)):
                         return self.genetic.correct_strategy(shakeStrategy)
@@ -65,95 +64,95 @@ class LocalSearch:
         if self.genetic.checkValidity(self.genetic.correct_strategy(shakeStrategy)):
             shakeStrategy = self.genetic.correct_strategy(shakeStrategy)
         else:
-            shakeStrategy = copy.deepcopy(self.strategy)
+            shakeStrategy = self.strategy.copy()
 
         return self.genetic.correct_strategy(shakeStrategy)
 
-    def local_search(self, strategy:dict, index:int, nextIndex:int):
+    def local_search(self, strategy:Strategy, index:int, nextIndex:int):
         """
         LocalSearch is working on the pitstops of the shaked strategy.
         It is a BestImprovement local search.
         """
-        localBest = copy.deepcopy(strategy)
-        localStrategy_1 = copy.deepcopy(strategy)
-        localStrategy_2 = copy.deepcopy(strategy)
+        localBest = strategy.copy()
+        localStrategy_1 = strategy.copy()
+        localStrategy_2 = strategy.copy()
         if index != 0:
-            localStrategy_1['PitStop'][index] = False
-            localStrategy_2['TyreCompound'][index] = localStrategy_2['TyreCompound'][index-1]
+            localStrategy_1.pitStop[index] = False
+            localStrategy_2.tyreCompound[index] = localStrategy_2.tyreCompound[index-1]
             for i in range(index, index-5, -1): 
                 if i > 0 and i < self.genetic.numLaps and i != index:
-                    localStrategy_1['PitStop'][i] = True
-                    localStrategy_1['TyreCompound'][i] = localStrategy_1['TyreCompound'][index]
+                    localStrategy_1.pitStop[i] = True
+                    localStrategy_1.tyreCompound[i] = localStrategy_1.tyreCompound[index]
                     self.genetic.correct_strategy(localStrategy_1)
 
-                    if localStrategy_1['TotalTime'] < localBest['TotalTime'] and self.genetic.checkValidity(localStrategy_1):
-                        localBest = copy.deepcopy(localStrategy_1)
+                    if localStrategy_1.totalTime < localBest.totalTime and self.genetic.checkValidity(localStrategy_1):
+                        localBest = localStrategy_1.copy()
                     else:
-                        localStrategy_1['PitStop'][i] = False
+                        localStrategy_1.pitStop[i] = False
 
             for i in range(index + 1, index + 6):
                 if i > 0 and i < self.genetic.numLaps and i != index:
-                    localStrategy_1['PitStop'][i] = True
-                    localStrategy_2['TyreCompound'][i] = localStrategy_2['TyreCompound'][i-1]
+                    localStrategy_1.pitStop[i] = True
+                    localStrategy_2.tyreCompound[i] = localStrategy_2.tyreCompound[i-1]
                     self.genetic.correct_strategy(localStrategy_2)
 
-                    if localStrategy_2['TotalTime'] < localBest['TotalTime'] and self.genetic.checkValidity(localStrategy_2):
-                        localBest = copy.deepcopy(localStrategy_2)
+                    if localStrategy_2.totalTime < localBest.totalTime and self.genetic.checkValidity(localStrategy_2):
+                        localBest = localStrategy_2.copy()
                     else:
-                        localStrategy_2['PitStop'][i] = False
+                        localStrategy_2.pitStop[i] = False
 
         if nextIndex != -1:
-            localStrategy_3 = copy.deepcopy(strategy)
-            localStrategy_4 = copy.deepcopy(strategy)
-            localStrategy_3['PitStop'][nextIndex] = False
-            localStrategy_4['TyreCompound'][nextIndex] = localStrategy_4['TyreCompound'][nextIndex-1]
+            localStrategy_3 = strategy.copy()
+            localStrategy_4 = strategy.copy()
+            localStrategy_3.pitStop[nextIndex] = False
+            localStrategy_4.tyreCompound[nextIndex] = localStrategy_4.tyreCompound[nextIndex-1]
             for i in range(nextIndex-1, nextIndex-6, -1): 
                 if i >= 0 and i < self.genetic.numLaps and i != nextIndex:
-                    localStrategy_3['PitStop'][i] = True
-                    localStrategy_3['TyreCompound'][i] = localStrategy_3['TyreCompound'][nextIndex]
+                    localStrategy_3.pitStop[i] = True
+                    localStrategy_3.tyreCompound[i] = localStrategy_3.tyreCompound[nextIndex]
                     self.genetic.correct_strategy(localStrategy_1)
 
-                    if localStrategy_3['TotalTime'] < localBest['TotalTime'] and self.genetic.checkValidity(localStrategy_3):
-                        localBest = copy.deepcopy(localStrategy_1)
+                    if localStrategy_3.totalTime < localBest.totalTime and self.genetic.checkValidity(localStrategy_3):
+                        localBest = localStrategy_1.copy()
                     else:
-                        localStrategy_3['PitStop'][i] = False
+                        localStrategy_3.pitStop[i] = False
 
             for i in range(nextIndex+1, nextIndex+6): 
                 if i >= 0 and i < self.genetic.numLaps and i != nextIndex:
-                    localStrategy_3['PitStop'][i] = True
-                    localStrategy_4['TyreCompound'][i] = localStrategy_4['TyreCompound'][i-1]
+                    localStrategy_3.pitStop[i] = True
+                    localStrategy_4.tyreCompound[i] = localStrategy_4.tyreCompound[i-1]
                     self.genetic.correct_strategy(localStrategy_2)
 
-                    if localStrategy_4['TotalTime'] < localBest['TotalTime'] and self.genetic.checkValidity(localStrategy_4):
-                        localBest = copy.deepcopy(localStrategy_2)
+                    if localStrategy_4.totalTime < localBest.totalTime and self.genetic.checkValidity(localStrategy_4):
+                        localBest = localStrategy_2.copy()
                     else:
-                        localStrategy_4['PitStop'][i] = False
+                        localStrategy_4.pitStop[i] = False
 
         return localBest
     
-    def move_or_not(self, localSearchStrategy: dict):
-        if self.strategy['TotalTime'] > localSearchStrategy['TotalTime']:
-            newStrategy = copy.deepcopy(localSearchStrategy)
+    def move_or_not(self, localSearchStrategy: Strategy):
+        if self.strategy.totalTime > localSearchStrategy.totalTime:
+            newStrategy = localSearchStrategy.copy()
         else:
-            newStrategy = copy.deepcopy(self.strategy)
+            newStrategy = self.strategy.copy()
 
         return newStrategy
 
     def run(self):
-        best = copy.deepcopy(self.strategy)
+        best = self.strategy.copy()
 
         start_timer = time.time()
 
-        for t in ['Soft', 'Medium', 'Hard','Inter','Wet']:
-            for p in range(0, self.strategy['NumPitStop']):
+        for t in range(len(COMPOUNDS)):
+            for p in range(0, self.strategy.numPitStop):
                 indexRandom = self.find_interval(p)
                 nextIndexRandom = self.find_interval(p+1)
                 shakeStrategy = self.shake(indexRandom, nextIndexRandom, t)
                 localSearchStrategy = self.local_search(shakeStrategy, indexRandom, nextIndexRandom)
                 newStrategy = self.move_or_not(localSearchStrategy)
-                if newStrategy['TotalTime'] < best['TotalTime']: #and self.genetic.checkValidity(newStrategy):
-                    best = copy.deepcopy(newStrategy)
+                if newStrategy.totalTime < best.totalTime: #and self.genetic.checkValidity(newStrategy):
+                    best = newStrategy.copy()
 
         end = time.time() - start_timer
 
-        return best, best['TotalTime'], end
+        return best.to_dict(), best.totalTime, end
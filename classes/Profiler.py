@@ -0,0 +1,81 @@
+import json
+import time
+import numpy as np
+
+# Phases of a generation of the genetic algorithm, in the order they are run
+PHASES: list = ['Dedup', 'Evaluation', 'Selection', 'Crossover', 'Mutation', 'RandomFill', 'Logging']
+
+class Profiler:
+    """
+    Wall time spent by every generation in each phase of the genetic algorithm, plus the counters of the model calls and of the fitness cache.
+    Times are kept in a table preallocated for all the generations, a phase is charged with the time elapsed since the previous mark.
+    """
+    def __init__(self, iterations:int) -> None:
+        self.times = np.zeros((iterations, len(PHASES)))
+        self.generations = 0
+        self.counters = {'LapTimes': 0, 'FuelLoads': 0, 'CacheHits': 0, 'CacheMisses': 0}
+        self.elapsed = 0.0
+        self.last = time.perf_counter()
+
+    def mark(self,):
+        """
+        Starts timing from now, the time elapsed before is not charged to any phase.
+        """
+        self.last = time.perf_counter()
+
+    def record(self, gen:int, phase:str):
+        """
+        Charges the time elapsed since the last mark to the phase of the generation.
+        """
+        now = time.perf_counter()
+        self.times[gen, PHASES.index(phase)] += now - self.last
+        self.generations = max(self.generations, gen+1)
+        self.last = now
+
+    def add(self, gen:int, phase:str, seconds:float):
+        """
+        Charges a time measured elsewhere (e.g. by the workers of the pool) to the phase of the generation.
+        """
+        self.times[gen, PHASES.index(phase)] += seconds
+        self.generations = max(self.generations, gen+1)
+
+    @classmethod
+    def merge(cls, profilers:list):
+        """
+        Sums the profilers of runs made in parallel (e.g. the islands), generation by generation.
+        """
+        merged = cls(max([len(p.times) for p in profilers]))
+        for profiler in profilers:
+            merged.times[:len(profiler.times)] += profiler.times
+            merged.generations = max(merged.generations, profiler.generations)
+            merged.elapsed = max(merged.elapsed, profiler.elapsed)
+            for key, value in profiler.counters.items():
+                merged.counters[key] = merged.counters.get(key, 0) + value
+
+        return merged
+
+    def to_dict(self) -> dict:
+        times = self.times[:self.generations]
+
+        return {
+            'Generations': self.generations,
+            'Elapsed': self.elapsed,
+            'Counters': dict(self.counters),
+            'Phases': {phase: {'Total': float(times[:, idx].sum()), 'Mean': float(times[:, idx].mean()) if self.generations else 0.0, 'Max': float(times[:, idx].max()) if self.generations else 0.0} for idx, phase in enumerate(PHASES)},
+            'PerGeneration': {phase: times[:, idx].round(6).tolist() for idx, phase in enumerate(PHASES)},
+        }
+
+    def summary(self,) -> str:
+        """
+        Returns the share of the time spent in each phase as a string for the reports.
+        """
+        totals = self.times[:self.generations].sum(axis=0)
+        share = totals / max(totals.sum(), 1e-12)
+        string = "Time per phase: " + ", ".join([f"{phase} {round(total, 3)}s ({round(100*s, 1)}%)" for phase, total, s in zip(PHASES, totals, share)]) + "\n"
+        string += f"Model calls: {self.counters['LapTimes']} lap times, {self.counters['FuelLoads']} fuel loads\n"
+
+        return string
+
+    def save(self, path:str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
@@ -4,18 +4,18 @@ import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 
-from classes.Car import get_data as gd
+from classes.Car import get_data as gd, read_session, detect_outlier_laps, review_laps
 from classes.Utils import ms_to_time
 
 class RaceData():
-    def __init__(self, path) -> None:
+    def __init__(self, path, review:bool=False) -> None:
         if os.path.isfile(os.path.join(path,"RaceData.json")):
             loaded = self.load(path)
             self.data = loaded.data
             self.total_time = loaded.total_time
         else:
             if os.path.exists(os.path.join(path, 'Race')):
-                self.data = gd(os.path.join(path, 'Race'), None, [], True)
+                self.data = gd(os.path.join(path, 'Race'), None, [], True, review)
                 for index in self.data.index:
                     self.data.at[index, 'StringLapTime'] = ms_to_time(self.data.at[index, 'LapTime'])
 
@@ -139,16 +139,18 @@ class RaceData():
         return data
 
 
-def plot_best(values:list, folder:str):
+def plot_best(values:list, folder:str, review:bool=False):
     folder = os.path.join(folder,"Race")
     if not os.path.isdir(folder):
         return 
 
     data = pd.DataFrame(columns=['Car', 'TotalLapTime'])
 
+    ### Lap.csv is read once with the columns of every car, then each car is taken from it
+    laps_data = read_session(os.path.join(folder, "Lap.csv"), ['CarIndex', 'CurrentLapNum', 'FrameIdentifier', 'LastLapTimeInMS'])
+
     for car_index in range(22):
-        lap = pd.read_csv(os.path.join(folder, "Lap.csv"))
-        lap = lap.loc[lap["CarIndex"] == car_index, ['CurrentLapNum', 'FrameIdentifier', 'LastLapTimeInMS']].drop_duplicates(['FrameIdentifier'], keep="last")
+        lap = laps_data.loc[laps_data["CarIndex"] == car_index, ['CurrentLapNum', 'FrameIdentifier', 'LastLapTimeInMS']].drop_duplicates(['FrameIdentifier'], keep="last")
         lap = lap.drop_duplicates(['CurrentLapNum','LastLapTimeInMS'], keep='first').sort_values(by=['FrameIdentifier']).set_index("FrameIdentifier")
 
         to_drop = []
@@ -157,18 +159,9 @@ def plot_best(values:list, folder:str):
                 to_drop = [int(x) for x in f.read().split(",")[:-1]]
         
         else:
-            laps = lap['CurrentLapNum']
-            duplicated_laps = lap[laps.isin(laps[laps.duplicated()])].sort_values("FrameIdentifier")
-            print(f"Lap DataFrame is the following:")
-            for idx, row in lap.iterrows():
-                print(f"{idx}, {row['CurrentLapNum']} -> {ms_to_time(row['LastLapTimeInMS'])}")
-            print(f"\nDuplicated ones are:\n{duplicated_laps}")
-            to_drop = input("If there are some wrong frames, insert now separated by comma or press ENTER if None: ")
-            if to_drop:
-                to_drop = np.array(to_drop.split(','), dtype=int)
-            with open(os.path.join(folder, "to_drop.txt"), "w") as f:
-                for frame in to_drop:
-                    f.write(f"{frame},")
+            ### to_drop.txt holds the frames of the player car, the ones of the other cars are detected every time and not saved
+            reasons = detect_outlier_laps(lap, race=True)
+            to_drop = review_laps(lap, reasons) if review else reasons.index[reasons != ''].tolist()
 
         for index in to_drop:
             if index in lap.index:
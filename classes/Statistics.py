@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+# Statistics of the fitness kept for every generation, in the order of the columns of Boxplot.csv
+STATISTICS: list = ['Min', 'Q1', 'Median', 'Q3', 'Max', 'Valid', 'Population']
+
+class Statistics:
+    """
+    Quartiles of the fitness of the valid strategies of every generation (the ones drawn by the boxplot), kept in a table preallocated for all the generations.
+    Every generation is appended to the csv as soon as it is computed, so nothing of the population is kept after it.
+    """
+    def __init__(self, iterations:int, path:str=None) -> None:
+        self.table = np.full((iterations, len(STATISTICS)), np.nan)
+        self.generations = 0
+        self.file = None
+
+        if path is not None:
+            self.file = open(path, 'w')
+            self.file.write(','.join(['Generation'] + STATISTICS) + '\n')
+
+    def insert(self, population:list):
+        fitnesses = np.array([x.totalTime for x in population if x.valid and x.totalTime > 0], dtype=float)
+
+        row = self.table[self.generations]
+        if len(fitnesses) > 0:
+            row[:5] = np.quantile(fitnesses, [0, 0.25, 0.5, 0.75, 1])
+        row[5] = len(fitnesses)
+        row[6] = len(population)
+
+        if self.file is not None:
+            ### Empty values for the generations without valid strategies, as pandas writes nan
+            self.file.write(','.join([str(self.generations)] + ['' if np.isnan(x) else str(x) for x in row[:5]] + [str(int(x)) for x in row[5:]]) + '\n')
+
+        self.generations += 1
+
+    def to_frame(self,) -> pd.DataFrame:
+        """
+        Returns the statistics of the generations made so far, one row per generation.
+        """
+        frame = pd.DataFrame(self.table[:self.generations], columns=STATISTICS)
+        frame[['Valid', 'Population']] = frame[['Valid', 'Population']].astype(int)
+        frame.index.name = 'Generation'
+
+        return frame
+
+    def close(self,):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
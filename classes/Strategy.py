@@ -0,0 +1,109 @@
+import numpy as np
+
+from classes.Utils import COMPOUNDS
+
+WHEELS: list = ['FL', 'FR', 'RL', 'RR']
+
+class Strategy:
+    """
+    Race strategy stored as small arrays with one entry per lap.
+    Compounds are stored as their code (index in COMPOUNDS), the weather list is shared among all the strategies of a run and it is never copied.
+    """
+    __slots__ = ('tyreCompound', 'tyreAge', 'tyreWear', 'fuelLoad', 'pitStop', 'lapTime', 'numPitStop', 'weather', 'valid', 'totalTime')
+
+    def __init__(self, numLaps:int, weather:list) -> None:
+        self.tyreCompound = np.zeros(numLaps, dtype=np.int8)
+        self.tyreAge = np.zeros(numLaps, dtype=np.int16)
+        self.tyreWear = np.zeros((numLaps, len(WHEELS)), dtype=np.float32)
+        self.fuelLoad = np.zeros(numLaps, dtype=np.float64)
+        self.pitStop = np.zeros(numLaps, dtype=bool)
+        self.lapTime = np.zeros(numLaps, dtype=np.int32)
+        self.numPitStop = 0
+        self.weather = weather
+        self.valid = False
+        self.totalTime = np.inf
+
+    def view(self):
+        """
+        Returns a new strategy sharing the arrays with this one.
+        Whoever changes it has to detach the arrays it changes first, so the strategies sharing them are not touched.
+        """
+        strategy = Strategy.__new__(Strategy)
+        strategy.tyreCompound = self.tyreCompound
+        strategy.tyreAge = self.tyreAge
+        strategy.tyreWear = self.tyreWear
+        strategy.fuelLoad = self.fuelLoad
+        strategy.pitStop = self.pitStop
+        strategy.lapTime = self.lapTime
+        strategy.numPitStop = self.numPitStop
+        strategy.weather = self.weather
+        strategy.valid = self.valid
+        strategy.totalTime = self.totalTime
+
+        return strategy
+
+    def detach(self, *fields:str):
+        """
+        Replaces the given arrays with private copies, they can then be changed in place.
+        """
+        for field in fields:
+            setattr(self, field, getattr(self, field).copy())
+
+    def copy(self):
+        strategy = self.view()
+        strategy.detach('tyreCompound', 'tyreAge', 'tyreWear', 'fuelLoad', 'pitStop', 'lapTime')
+
+        return strategy
+
+    def __deepcopy__(self, memo:dict):
+        return self.copy()
+
+    def genome(self) -> bytes:
+        """
+        Canonical key of the strategy: compounds, pit stops and initial fuel determine all the other fields.
+        """
+        return self.tyreCompound.tobytes() + self.pitStop.tobytes() + self.fuelLoad[:1].tobytes()
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Strategy):
+            return NotImplemented
+
+        return self.genome() == other.genome()
+
+    def __hash__(self) -> int:
+        return hash(self.genome())
+
+    def to_dict(self) -> dict:
+        """
+        Returns the strategy in the dictionary format used by the reports.
+        """
+        return {
+            'TyreCompound': [COMPOUNDS[c] for c in self.tyreCompound.tolist()],
+            'TyreAge': self.tyreAge.tolist(),
+            'TyreWear': [{key: round(val, 2) for key, val in zip(WHEELS, wear)} for wear in self.tyreWear.tolist()],
+            'FuelLoad': [round(fuel, 2) for fuel in self.fuelLoad.tolist()],
+            'PitStop': self.pitStop.tolist(),
+            'LapTime': self.lapTime.tolist(),
+            'NumPitStop': self.numPitStop,
+            'Weather': self.weather,
+            'Valid': self.valid,
+            'TotalTime': self.totalTime,
+        }
+
+    @classmethod
+    def from_dict(cls, strategy:dict):
+        """
+        Builds a strategy from the dictionary format used by the reports.
+        """
+        new = cls(len(strategy['LapTime']), strategy['Weather'])
+        new.tyreCompound[:] = [COMPOUNDS.index(c) for c in strategy['TyreCompound']]
+        new.tyreAge[:] = strategy['TyreAge']
+        new.tyreWear[:] = [[wear[key] for key in WHEELS] for wear in strategy['TyreWear']]
+        new.fuelLoad[:] = strategy['FuelLoad']
+        new.pitStop[:] = strategy['PitStop']
+        new.lapTime[:] = strategy['LapTime']
+        new.numPitStop = strategy['NumPitStop']
+        new.valid = strategy['Valid']
+        new.totalTime = strategy['TotalTime']
+
+        return new
@@ -1,7 +1,11 @@
 import os
 import sys
+import json
 import math
+import time
+import atexit
 import logging
+import weakref
 
 from datetime import datetime
 
@@ -17,6 +21,9 @@ CIRCUIT: dict = {
     'Barcelona' : {'Laps': 66, 'PitStopTime':22500, 'Tyres':{'SoftNew': 0, 'SoftUsed': 2, 'MediumNew': 1, 'MediumUsed':1, 'HardNew': 1, 'HardUsed': 1}},
 }
 
+# Compounds handled by the solvers, the position in the list is the code used by the lookup tables
+COMPOUNDS: list = ['Soft', 'Medium', 'Hard', 'Inter', 'Wet']
+
 VISUAL_COMPOUNDS: dict = {
     0:"N/A",
     1:"N/A",
@@ -87,27 +94,93 @@ class CustomFormatter(logging.Formatter):
         return formatter.format(record)
 
 
+# Policies when the log of a run already exists: overwrite it, append to it or stop with an error (the log never waits for an answer)
+LOG_POLICIES: list = ['overwrite', 'append', 'error']
+
+# Logs not closed yet, what they still buffer is written when the interpreter exits
+OPEN_LOGS = weakref.WeakSet()
+
+@atexit.register
+def close_logs():
+    for log in list(OPEN_LOGS):
+        log.close()
+
 class Log():
-    def __init__(self, path:str, values:dict):
+    """
+    Log of a run kept in memory: messages go to Log.log and the records given to metrics go to Metrics.jsonl, one json per line.
+    Buffers are written when they hold more than buffer_size characters, when flush_interval seconds have passed since the last write (checked by
+    write and metrics), at close and at the exit of the interpreter if the log was not closed.
+    """
+    def __init__(self, path:str, values:dict, policy:str='overwrite', buffer_size:int=65536, flush_interval:float=5.0):
         self.path = os.path.join(path, 'Log.log')
+        self.metrics_path = os.path.join(path, 'Metrics.jsonl')
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.messages = []
+        self.records = []
+        self.size = 0
+        self.last_flush = time.monotonic()
 
         if not os.path.exists(os.path.dirname(self.path)):
             os.makedirs(os.path.dirname(self.path))
 
-        if os.path.exists(self.path):
-            print(f"Log file already exists at {self.path}, do you want to overwrite? [Y/n]", end=" ")
-            if input().lower() == 'y':
-                os.remove(self.path)
-            elif input().lower() == 'n':
-                sys.exit(0)
+        if policy not in LOG_POLICIES:
+            raise ValueError(f"Unknown log policy '{policy}', it must be one of {LOG_POLICIES}")
+
+        if os.path.exists(self.path) or os.path.exists(self.metrics_path):
+            if policy == 'error':
+                raise FileExistsError(f"Log file already exists at {self.path}")
+            elif policy == 'overwrite':
+                for file in [self.path, self.metrics_path]:
+                    if os.path.exists(file):
+                        os.remove(file)
 
         self.write(f"Log file of circuit {values['Circuit']} at {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n\n")
         self.write(f"Population: {values['Population']}\nIterations: {values['Iterations']}\nMutation: {values['Mutation']}\nCrossover: {values['Crossover']}\nPitStopTime: {ms_to_time(values['PitStopTime'])}\nWeather: '{values['Weather']}'\n\n")
+        self.flush()
+        OPEN_LOGS.add(self)
+
+    def __getstate__(self):
+        ### Copies of the log (e.g. in the workers of a pool) must not write again what is buffered here
+        state = self.__dict__.copy()
+        state['messages'] = []
+        state['records'] = []
+        state['size'] = 0
 
+        return state
 
     def write(self, msg:str):
-        with open(self.path, 'a') as f:
-            f.write(msg)
+        self.messages.append(msg)
+        self.size += len(msg)
+        self.check()
+
+    def metrics(self, record:dict):
+        line = json.dumps(record)
+        self.records.append(line)
+        self.size += len(line)
+        self.check()
+
+    def check(self,):
+        if self.size >= self.buffer_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self,):
+        if len(self.messages) > 0:
+            with open(self.path, 'a') as f:
+                f.write(''.join(self.messages))
+        
+        if len(self.records) > 0:
+            with open(self.metrics_path, 'a') as f:
+                f.write('\n'.join(self.records) + '\n')
+
+        self.messages = []
+        self.records = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+
+    def close(self,):
+        self.flush()
+        OPEN_LOGS.discard(self)
 
 
 def time_to_ms(string):
@@ -2,11 +2,8 @@ import os
 import sys
 import logging
 
-from random import SystemRandom
-
 from classes.Utils import CIRCUIT, get_basic_logger
 
-random = SystemRandom()
 logger = get_basic_logger(name='Weather', level=logging.INFO)
 
 def weather_summary(circuit:str, weather_file:str):
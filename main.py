@@ -5,14 +5,16 @@ import logging
 import argparse
 import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 
 from datetime import datetime
 
 from classes.Genetic import GeneticSolver
+from classes.Island import IslandSolver
 from classes.Car import get_car_data, Car
 from classes.LocalSearch import LocalSearch
 from classes.Weather import weather_summary
-from classes.Utils import CIRCUIT, ms_to_time, time_to_ms, get_basic_logger
+from classes.Utils import LOG_POLICIES, ms_to_time, get_basic_logger
 
 parser = argparse.ArgumentParser(description='Process F1 Data.')
 parser.add_argument('--c', type=str, default=None, help='Circuit path')
@@ -22,11 +24,22 @@ parser.add_argument('--cross', type=float, default=0.6, help='Crossover probabil
 parser.add_argument('--i', type=int, default=1000, help='Iterations')
 parser.add_argument('--w', type=str, default=None, help='Weather file')
 parser.add_argument('--d', action='store_true', default=False, help='Data Collection mode')
+parser.add_argument('--pits', type=int, default=2, help='Maximum number of pit stops of the lower bound')
+parser.add_argument('--bf', action='store_true', default=False, help='Compute the lower bound with the branch and bound bruteforce (on --workers processes) instead of the dynamic programming')
+parser.add_argument('--split', type=int, default=8, help='Depth (laps) at which the bruteforce tree is split among the workers')
+parser.add_argument('--cache', type=int, default=100000, help='Maximum number of evaluations kept in the fitness cache (0 disables it)')
+parser.add_argument('--workers', type=int, default=1, help='Number of processes building the offspring (and exploring the bruteforce tree)')
+parser.add_argument('--islands', type=int, default=1, help='Number of islands of the island model (1 runs a single population)')
+parser.add_argument('--seed', type=int, default=None, help='Seed of the random generator (the run is reproducible given the seed and the workers are not relevant), with --d the n-th run uses seed+n-1')
+parser.add_argument('--stats', action='store_true', default=False, help='Save the time spent in every phase of the genetic algorithm in Stats.json, next to Log.log')
+parser.add_argument('--log', type=str, default='overwrite', choices=LOG_POLICIES, help='What to do if the log of the run already exists')
+parser.add_argument('--migration', type=int, default=10, help='Generations between two migrations of the island model')
+parser.add_argument('--review', action='store_true', default=False, help='Review the laps dropped automatically from the sessions without a to_drop.txt before it is written')
 args = parser.parse_args()
 
 logger = get_basic_logger('main', logging.INFO)
     
-def main(population:int, mutation_pr:float, crossover_pr:float, iterations:int, weather:str, base_path:str):
+def main(population:int, mutation_pr:float, crossover_pr:float, iterations:int, weather:str, base_path:str, seed:int=None):
     print(f"\n---------------------START----------------------\n")
     if args.c is None:
         circuits = [os.path.abspath(os.path.join('Data', path)) for path in os.listdir(os.path.abspath('Data'))]
@@ -52,38 +65,40 @@ def main(population:int, mutation_pr:float, crossover_pr:float, iterations:int,
         while not os.path.exists(os.path.dirname(save_path)):
             os.makedirs(os.path.dirname(save_path))
 
-        car:Car = get_car_data(circuit)
+        car:Car = get_car_data(circuit, review=args.review, seed=seed)
 
         # race_data:RaceData = RaceData(circuit)
         # race_data.plot(path=circuit)
         
-        genetic = GeneticSolver(population=population, mutation_pr=mutation_pr, crossover_pr=crossover_pr, iterations=iterations, car=car, circuit=_circuit, save_path=save_path, weather=weather)
-
-        bruteforce_save_path = os.path.join(circuit, "Bruteforce_strategy.log")
-        if not os.path.isfile(bruteforce_save_path):
-            bruteforce_strategy = genetic.lower_bound()
-            with open(bruteforce_save_path, "a") as f:
-                laps = genetic.numLaps
-                strategy, timing = bruteforce_strategy
-                for lap in range(laps):
-                    f.write(f"Lap {lap+1}/{laps} -> Compound: '{strategy[lap]['Compound']}', TyreAge: {strategy[lap]['TyreAge']} Laps, TyreWear: FL:{round(strategy[lap]['TyreWear']['FL']*100,1)}% FR:{round(strategy[lap]['TyreWear']['FR']*100,1)}% RL:{round(strategy[lap]['TyreWear']['RL']*100,1)} RR:{round(strategy[lap]['TyreWear']['RR']*100,1)}%, FuelLoad: {strategy[lap]['FuelLoad']} Kg, PitStop: {'Yes' if strategy[lap]['PitStop'] else 'No'}, LapTime: {ms_to_time(strategy[lap]['LapTime'])} (hh:)mm:ss.ms\n")
-                t = f"{int(timing):,}".replace(",", " ")
-                f.write(f"\nFitness: {t}\n")
-                f.write(f"Total time: {ms_to_time(timing)}")
-        
-        with open(bruteforce_save_path, 'r') as f:
-            lines = f.readlines()
-        
-        bf_time = lines[-1].split(" ")
-        bf_time_in_ms = time_to_ms(bf_time[-1])
+        genetic = GeneticSolver(population=population, mutation_pr=mutation_pr, crossover_pr=crossover_pr, iterations=iterations, car=car, circuit=_circuit, save_path=save_path, weather=weather, cache_size=args.cache, workers=args.workers, seed=seed, log_policy=args.log)
+
+        ### The lower bound is taken from the cache of the circuit, or computed by the exact dynamic programming solver (or by the bruteforce), and saved with the outputs of the run
+        strategy, bf_time_in_ms = genetic.cached_lower_bound(circuit, max_pit_stops=args.pits, bruteforce=args.bf, split_depth=args.split)
+        if strategy is None:
+            print(f"No strategy satisfies the constraints of the lower bound...")
+            exit(-1)
+
+        bruteforce_save_path = os.path.join(save_path, "Bruteforce_strategy.log")
+        with open(bruteforce_save_path, "w") as f:
+            laps = genetic.numLaps
+            timing = bf_time_in_ms
+            for lap in range(laps):
+                f.write(f"Lap {lap+1}/{laps} -> Compound: '{strategy[lap]['Compound']}', TyreAge: {strategy[lap]['TyreAge']} Laps, TyreWear: FL:{round(strategy[lap]['TyreWear']['FL']*100,1)}% FR:{round(strategy[lap]['TyreWear']['FR']*100,1)}% RL:{round(strategy[lap]['TyreWear']['RL']*100,1)} RR:{round(strategy[lap]['TyreWear']['RR']*100,1)}%, FuelLoad: {strategy[lap]['FuelLoad']} Kg, PitStop: {'Yes' if strategy[lap]['PitStop'] else 'No'}, LapTime: {ms_to_time(strategy[lap]['LapTime'])} (hh:)mm:ss.ms\n")
+            t = f"{int(timing):,}".replace(",", " ")
+            f.write(f"\nFitness: {t}\n")
+            f.write(f"Total time: {ms_to_time(timing)}")
 
         print(f"Lower bound: {ms_to_time(bf_time_in_ms)}\n")
 
-        best, best_eval, boxplot_data, fitness_data, timer = genetic.run(bf_time = bf_time_in_ms) 
+        if args.islands > 1:
+            islands = IslandSolver(islands=args.islands, population=population, mutation_pr=mutation_pr, crossover_pr=crossover_pr, iterations=iterations, car=car, circuit=_circuit, save_path=save_path, weather=weather, cache_size=args.cache, workers=args.workers, interval=args.migration, seed=seed, log_policy=args.log)
+            best, best_eval, boxplot_data, fitness_data, timer = islands.run(bf_time = bf_time_in_ms, save_stats=args.stats)
+        else:
+            best, best_eval, boxplot_data, fitness_data, timer = genetic.run(bf_time = bf_time_in_ms, save_stats=args.stats) 
         
         print(f"\n------------------------------------------------\n")
         print(f"EA timing: {ms_to_time(best_eval)}")
-        print(f"Bruteforce give timing: {bf_time[-1]}")
+        print(f"Bruteforce give timing: {ms_to_time(bf_time_in_ms)}")
         print(f"\n------------------------------------------------\n")
 
         print(f"\n------------------------------------------------\n")
@@ -112,12 +127,15 @@ def main(population:int, mutation_pr:float, crossover_pr:float, iterations:int,
             f.write(string)
         print(string)
         print(f"EA timing: {ms_to_time(best_eval)}")
-        print(f"Bruteforce timing: {bf_time[-1]}")
+        print(f"Bruteforce timing: {ms_to_time(bf_time_in_ms)}")
         print("\n------------------------------------------------\n")
 
         # Plots
-        fit_gen_boxplot = px.box(boxplot_data, title="Boxplot fitnesses of every generation")
-        fit_gen_boxplot.update_layout(xaxis_title="Generation", yaxis_title="Fitness")
+        ### Boxes are drawn from the quartiles of every generation, the island model has a box per island
+        fit_gen_boxplot = go.Figure()
+        for island, data in (boxplot_data.groupby('Island') if 'Island' in boxplot_data.columns else [(None, boxplot_data)]):
+            fit_gen_boxplot.add_trace(go.Box(x=data.index, lowerfence=data['Min'], q1=data['Q1'], median=data['Median'], q3=data['Q3'], upperfence=data['Max'], name='Fitness' if island is None else f'Island {island}'))
+        fit_gen_boxplot.update_layout(title="Boxplot fitnesses of every generation", xaxis_title="Generation", yaxis_title="Fitness", boxmode='group')
         fit_gen_boxplot.write_html(os.path.join(save_path, "Boxplot_fitnesses.html"))
 
         y_values = []
@@ -135,7 +153,7 @@ def main(population:int, mutation_pr:float, crossover_pr:float, iterations:int,
                 fitness_data['LapTime'].append(np.nan)
 
         fit_line = px.line(fitness_data, x="Generation", y="Fitness", title=f"Line plot fitnesses for {_circuit}")#, color="Fitness")
-        fit_line.add_hline(y=bf_time_in_ms, line_color="red", annotation_text=f"Bruteforce time -> {bf_time[-1]}", annotation_position="top left")
+        fit_line.add_hline(y=bf_time_in_ms, line_color="red", annotation_text=f"Bruteforce time -> {ms_to_time(bf_time_in_ms)}", annotation_position="top left")
         
         fit_line.update_traces(textposition='top center')
         fit_line.update_layout(
@@ -181,7 +199,9 @@ if __name__ == "__main__":
         counter = 0
         while True:
             counter += 1
-            strategy, timing, bruteforce_time, log_path, timer, ls_timing, ls_timer = main(population=population, mutation_pr=mutation_pr, crossover_pr=crossover_pr, iterations=iterations, weather=weather, base_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Outputs'))
+            ### Every run of the collection gets its own seed from the one given, otherwise they would all be the same run
+            seed = None if args.seed is None else args.seed + counter - 1
+            strategy, timing, bruteforce_time, log_path, timer, ls_timing, ls_timer = main(population=population, mutation_pr=mutation_pr, crossover_pr=crossover_pr, iterations=iterations, weather=weather, base_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Outputs'), seed=seed)
            
             log_path = log_path.replace("\\", "/").split("/")[-1]
         
@@ -194,7 +214,7 @@ if __name__ == "__main__":
 
     else:
 
-        strategy, timing, bruteforce_time, log_path, timer, ls_timing, ls_timer = main(population=population, mutation_pr=mutation_pr, crossover_pr=crossover_pr, iterations=iterations, weather=weather, base_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Outputs'))
+        strategy, timing, bruteforce_time, log_path, timer, ls_timing, ls_timer = main(population=population, mutation_pr=mutation_pr, crossover_pr=crossover_pr, iterations=iterations, weather=weather, base_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Outputs'), seed=args.seed)
 
         log_path = log_path.replace("\\", "/").split("/")[-1]
         
@@ -0,0 +1,12 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Fixture to run the tests from the root of the repository, the solvers read the circuits from the Data folder
+@pytest.fixture
+def repo_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    return ROOT
@@ -0,0 +1,158 @@
+import os
+import json
+import pickle
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+
+from classes.Car import CAR_PARAMETERS, Car, detect_outlier_laps, get_car_data, get_nearest_frame, legacy_hash, load_data_cache, read_session, save_data_cache
+
+# Function to get the practice data of a circuit as the calibration takes it
+def practice_data(circuit:str) -> dict:
+    with open(f"Data/{circuit}/Data.json", 'rb') as f:
+        return pickle.load(f)
+
+def test_calibration_is_reproducible_given_the_seed(repo_root):
+    data = practice_data('Monza')
+    first, second = Car(data=data, seed=3), Car(data=data, seed=3)
+
+    for key in ['drs_lose', 'fuel_lose', 'fuel_consume_coeff', 'time_diff', 'tyre_wear_coeff', 'tyre_coeff']:
+        assert getattr(first, key) == getattr(second, key)
+
+def test_read_session_of_an_empty_csv(tmp_path):
+    path = tmp_path / 'Lap.csv'
+    path.write_text('FrameIdentifier,CarIndex,CurrentLapNum,LastLapTimeInMS\n')
+
+    lap = read_session(str(path), ['FrameIdentifier', 'LastLapTimeInMS'], car_index=0)
+    assert len(lap) == 0
+    assert list(lap.columns) == ['FrameIdentifier', 'LastLapTimeInMS']
+    assert lap['FrameIdentifier'].dtype == np.int32
+
+def test_read_session_keeps_the_rows_of_the_car(tmp_path):
+    path = tmp_path / 'Damage.csv'
+    path.write_text('FrameIdentifier,CarIndex,TyresWearFL\n' + ''.join([f"{frame},{frame % 3},{frame / 10}\n" for frame in range(30)]))
+
+    damage = read_session(str(path), ['FrameIdentifier', 'TyresWearFL'], car_index=1, chunksize=7)
+    assert damage['FrameIdentifier'].tolist() == list(range(1, 30, 3))
+    assert damage['TyresWearFL'].dtype == np.float32
+
+def test_data_cache_gives_the_same_car(repo_root, tmp_path):
+    data = practice_data('Monza')
+    save_data_cache(str(tmp_path), data, digest='sessions')
+
+    assert load_data_cache(str(tmp_path), digest='other sessions') is None
+    cached = load_data_cache(str(tmp_path), digest='sessions')
+    assert list(cached.keys()) == list(data.keys())
+
+    car, cached_car = Car(data=data, seed=0), Car(data=cached, seed=0)
+    for key in CAR_PARAMETERS:
+        assert getattr(cached_car, key) == getattr(car, key)
+
+# Function to write a practice session of two cars (the player is car 1) with a lap every 100 frames and a change of compound halfway
+def write_session(folder, seed:int, laps:int=20):
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    frames = np.arange(laps * 100)
+    lap_times = 90000 + rng.integers(0, 1000, laps + 1)
+    cars = [pd.DataFrame({'FrameIdentifier': frames, 'CarIndex': car}) for car in range(2)]
+
+    lap = pd.concat([frame.assign(PlayerCarIndex=1, CurrentLapNum=frames // 100 + 1, LastLapTimeInMS=np.where(frames >= 100, lap_times[frames // 100], 0), DriverStatus=1) for frame in cars])
+    telemetry = pd.concat([frame.assign(DRS=(frames // 50) % 2) for frame in cars])
+    status = pd.concat([frame.assign(FuelInTank=100 - frames / 50, VisualTyreCompound=np.where(frames < laps * 50, 16, 17)) for frame in cars])
+    damage = pd.concat([frame.assign(TyresWearFL=1 + (frames % (laps * 50)) / 40, TyresWearFR=1 + (frames % (laps * 50)) / 45, TyresWearRL=1 + (frames % (laps * 50)) / 50, TyresWearRR=1 + (frames % (laps * 50)) / 55) for frame in cars])
+    for name, table in [('Lap', lap), ('Telemetry', telemetry), ('Status', status), ('Damage', damage)]:
+        table.sort_values(['FrameIdentifier', 'CarIndex']).to_csv(os.path.join(folder, f"{name}.csv"), index=False)
+    with open(os.path.join(folder, 'to_drop.txt'), 'w') as f:
+        f.write('')
+
+def test_changed_sessions_calibrate_the_car_again(tmp_path, monkeypatch):
+    write_session(tmp_path / 'FP1', seed=0)
+    car = get_car_data(str(tmp_path), seed=0)
+
+    ### The car of the same sessions is read without loading the practice data
+    with monkeypatch.context() as patch:
+        patch.setattr('classes.Car.get_practice_data', lambda *args: pytest.fail('practice data loaded'))
+        assert get_car_data(str(tmp_path)).source == car.source
+
+    write_session(tmp_path / 'FP1', seed=1)
+    recalibrated = get_car_data(str(tmp_path), seed=0)
+    assert recalibrated.source != car.source
+    with open(tmp_path / 'Car.json', 'r') as f:
+        assert json.load(f)['Source'] == recalibrated.source
+
+def test_changed_legacy_data_rebuilds_the_cache(repo_root, tmp_path):
+    shutil.copy('Data/Monza/Data.json', tmp_path)
+    get_car_data(str(tmp_path), seed=0)
+    assert load_data_cache(str(tmp_path), legacy_hash(str(tmp_path))) is not None
+
+    ### Without sessions the cache is checked against the pickle it was built from
+    shutil.copy('Data/Spielberg/Data.json', tmp_path)
+    assert load_data_cache(str(tmp_path), legacy_hash(str(tmp_path))) is None
+    get_car_data(str(tmp_path), seed=0)
+    assert list(load_data_cache(str(tmp_path), legacy_hash(str(tmp_path))).keys()) == list(practice_data('Spielberg').keys())
+
+# Function to align the frames as get_nearest_frame did before the binary search: every frame of the list is looked for linearly in the frames of df
+def linear_nearest_frame(df, frameList):
+    framesReturn = []
+    toRemove = []
+    for frame in frameList:
+        if frame in df['FrameIdentifier'].values:
+            framesReturn.append(frame)
+        else:
+            notFound = True
+            add = 1
+            while notFound and ((frame + add) < max(df['FrameIdentifier'].values)):
+                if (frame + add) in framesReturn:
+                    pass
+                elif (frame + add) in df['FrameIdentifier'].values:
+                    framesReturn.append(frame + add)
+                    notFound = False
+                add += 1
+
+            if notFound:
+                toRemove.append(frame)
+
+    return framesReturn, toRemove
+
+def test_nearest_frame_matches_the_linear_search():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        ### Few frames in a short range, so frames are often missing, asked twice (ties) or already taken by an earlier frame
+        df = pd.DataFrame({'FrameIdentifier': rng.choice(40, size=rng.integers(1, 15), replace=True)})
+        frameList = rng.integers(0, 45, size=rng.integers(0, 12)).tolist()
+
+        assert get_nearest_frame(df, frameList) == linear_nearest_frame(df, frameList)
+
+def test_nearest_frame_of_the_edge_cases():
+    df = pd.DataFrame({'FrameIdentifier': [10, 12, 14, 20]})
+
+    ### Both 11 want 12: the second one gets 14, then 13 finds no free frame before the last one of df (never taken)
+    assert get_nearest_frame(df, [11, 11, 13, 15]) == linear_nearest_frame(df, [11, 11, 13, 15]) == ([12, 14], [13, 15])
+    assert get_nearest_frame(df, [12, 11]) == linear_nearest_frame(df, [12, 11]) == ([12, 14], [])
+    assert get_nearest_frame(df, []) == ([], [])
+    assert get_nearest_frame(pd.DataFrame({'FrameIdentifier': []}), [3, 5]) == ([], [3, 5])
+
+def test_detect_outlier_laps():
+    ### Two stints split by a stop in the garage (the lap number goes on), lap 7 is recorded twice
+    laps = list(range(1, 11)) + [7] + list(range(11, 17))
+    frames = [100 * lap for lap in range(1, 11)] + [750] + [5000 + 100 * lap for lap in range(6)]
+    times = [90000 + 200 * (lap % 3) for lap in laps]
+    times[0], times[4], times[9], times[10], times[11] = 120000, 150000, 110000, 93000, 125000
+    lap = pd.DataFrame({'CurrentLapNum': laps, 'LastLapTimeInMS': times}, index=pd.Index(frames, name='FrameIdentifier')).sort_index()
+
+    reasons = detect_outlier_laps(lap)
+    assert reasons[reasons != ''].to_dict() == {100: 'OutLap', 500: 'Anomalous', 750: 'Duplicated', 1000: 'InLap', 5000: 'OutLap'}
+
+    ### In a race only the duplicated laps are dropped
+    reasons = detect_outlier_laps(lap, race=True)
+    assert reasons[reasons != ''].to_dict() == {750: 'Duplicated'}
+
+def test_review_of_a_calibrated_car_is_skipped(tmp_path, monkeypatch, caplog):
+    write_session(tmp_path / 'FP1', seed=0)
+    get_car_data(str(tmp_path), seed=0)
+
+    monkeypatch.setattr('builtins.input', lambda *args: pytest.fail('laps reviewed'))
+    with caplog.at_level('INFO', logger='Car'):
+        get_car_data(str(tmp_path), review=True)
+    assert 'not reviewed' in caplog.text
@@ -0,0 +1,103 @@
+import copy
+import itertools
+import pytest
+import numpy as np
+
+from classes.Car import get_car_data
+from classes.Genetic import GeneticSolver
+
+# Function to build a solver of the circuit writing its log in the temporary folder
+def make_solver(circuit:str, tmp_path, seed:int=0, weather:str='Sunny.txt') -> GeneticSolver:
+    return GeneticSolver(population=4, car=get_car_data(f"Data/{circuit}"), circuit=circuit, weather=weather, save_path=str(tmp_path), seed=seed)
+
+# Function to get a solver of the first laps of the race only, as the benchmark does
+def truncated_solver(solver:GeneticSolver, laps:int) -> GeneticSolver:
+    truncated = copy.copy(solver)
+    truncated.numLaps = laps
+    truncated.tyreWearTable = solver.tyreWearTable[:, :laps]
+    truncated.lapTimeTable = solver.lapTimeTable[:, :laps, :laps]
+    truncated.maxStintLength = np.minimum(solver.maxStintLength, laps)
+    truncated.bruteforceTables = None
+
+    return truncated
+
+# Function to get the lower bound by enumerating every compound and pit stop of every lap, it is inf if no strategy is valid
+def enumerated_lower_bound(solver:GeneticSolver, max_pit_stops:int) -> int:
+    lapTimes = solver.bruteforce_lap_times()
+    weather = solver.weather.get_weather_percentage_list()
+    choices = [[(compound, pitStop) for compound in solver.allowed_compounds(weather[lap]) for pitStop in ([False] if lap == 0 else [False, True])] for lap in range(solver.numLaps)]
+
+    best = np.inf
+    for decisions in itertools.product(*choices):
+        compounds, pitStops = zip(*decisions)
+        if sum(pitStops) > max_pit_stops or len(set(compounds)) < 2:
+            continue
+        ### The compound is changed only with a pit stop
+        if any([compounds[lap] != compounds[lap-1] and not pitStops[lap] for lap in range(1, solver.numLaps)]):
+            continue
+
+        best = min(best, strategy_time(lapTimes, compounds, pitStops))
+
+    return best
+
+# Function to get the time of the decision vectors of the bruteforce from its lap times
+def strategy_time(lapTimes:np.ndarray, compounds:list, pitStops:list) -> float:
+    total, age = 0, 0
+    for lap, (compound, pitStop) in enumerate(zip(compounds, pitStops)):
+        age = 0 if pitStop or lap == 0 else age + 1
+        total += lapTimes[compound, age, lap, int(pitStop)]
+
+    return total
+
+@pytest.mark.parametrize('circuit', ['Monza', 'Spielberg'])
+def test_lap_times_match_scalar_model(repo_root, tmp_path, circuit):
+    solver = make_solver(circuit, tmp_path)
+    for strategy in solver.randomChildren(300):
+        ### The scalar model gets the fuel of every lap as a python float from the initial one, lap 0 included
+        laps = np.arange(solver.numLaps)
+        initial = float(strategy.fuelLoad[0])
+        fuel = [initial] + [solver.getFuelLoad(initial, lap) for lap in laps[1:]]
+        lapTimes = solver.getLapTimes(strategy.tyreCompound, strategy.tyreAge, laps, strategy.fuelLoad, strategy.pitStop)
+        expected = [solver.getLapTime(int(strategy.tyreCompound[lap]), int(strategy.tyreAge[lap]), lap, fuel[lap], bool(strategy.pitStop[lap])) for lap in laps]
+
+        assert strategy.fuelLoad.tolist() == fuel
+
+        assert lapTimes.tolist() == expected
+        assert strategy.lapTime.tolist() == expected
+
+def test_crossover_fuel_matches_correction(repo_root, tmp_path):
+    solver = make_solver('Monza', tmp_path)
+    strategies = solver.randomChildren(50)
+    for p1, p2 in zip(strategies[::2], strategies[1::2]):
+        c1, c2 = solver.crossover_fuel(p1.view(), p2.view())
+        for child in (c1, c2):
+            corrected = solver.correct_strategy(child.copy())
+            assert child.lapTime.tolist() == corrected.lapTime.tolist()
+            assert child.totalTime == corrected.totalTime
+        assert c1.fuelLoad[0] == p2.fuelLoad[0] and c2.fuelLoad[0] == p1.fuelLoad[0]
+
+def test_random_children_do_not_share_the_batch(repo_root, tmp_path):
+    solver = make_solver('Monza', tmp_path)
+    for strategy in solver.randomChildren(5):
+        for field in ['tyreCompound', 'tyreAge', 'tyreWear', 'fuelLoad', 'pitStop', 'lapTime']:
+            assert getattr(strategy, field).base is None
+
+@pytest.mark.parametrize('weather', ['Sunny.txt', 'Weather.txt'])
+@pytest.mark.parametrize('max_pit_stops', [1, 2])
+def test_lower_bounds_match_the_enumeration(repo_root, tmp_path, weather, max_pit_stops):
+    solver = truncated_solver(make_solver('Monza', tmp_path, weather=weather), laps=6)
+    lapTimes = solver.bruteforce_lap_times()
+    expected = enumerated_lower_bound(solver, max_pit_stops)
+
+    strategy, dp_time = solver.lower_bound_dp(max_pit_stops)
+    assert dp_time == expected
+    if strategy is not None:
+        assert sum([lap['LapTime'] for lap in strategy]) == expected
+
+    ### Subtrees of the split explored one after the other, as the workers of lower_bound do
+    for split_depth in [1, 3]:
+        results = [solver.branch_and_bound(prefix, max_pit_stops=max_pit_stops) for prefix in solver.bruteforce_prefixes(split_depth, max_pit_stops)]
+        bb_time, decisions = min(results, key=lambda x: x[0])
+        assert bb_time == expected
+        if decisions is not None:
+            assert strategy_time(lapTimes, *decisions) == expected
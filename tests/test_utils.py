@@ -0,0 +1,28 @@
+import json
+
+from classes.Utils import OPEN_LOGS, Log, close_logs
+
+VALUES: dict = {'Circuit': 'Monza', 'Population': 4, 'Iterations': 1, 'Mutation': 0.9, 'Crossover': 0.6, 'PitStopTime': 24000, 'Weather': 'Sunny.txt'}
+
+# Function to get the records written in Metrics.jsonl
+def written_records(tmp_path) -> list:
+    path = tmp_path / 'Metrics.jsonl'
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+def test_metrics_are_written_when_the_interval_passes(tmp_path):
+    log = Log(str(tmp_path), VALUES, flush_interval=0)
+    log.metrics({'Generation': 0})
+    assert written_records(tmp_path) == [{'Generation': 0}]
+    log.close()
+
+def test_logs_not_closed_are_written_at_exit(tmp_path):
+    log = Log(str(tmp_path), VALUES, flush_interval=3600)
+    log.write("Generation 0\n")
+    log.metrics({'Generation': 0})
+    assert written_records(tmp_path) == [] and log in OPEN_LOGS
+
+    ### close_logs is what runs at the exit of the interpreter
+    close_logs()
+    assert written_records(tmp_path) == [{'Generation': 0}]
+    assert (tmp_path / 'Log.log').read_text().endswith("Generation 0\n")
+    assert log not in OPEN_LOGS